@@ -3,20 +3,865 @@
 代理腾讯财经 API，解决跨域和编码问题
 """
 
+import asyncio
+import base64
+import hashlib
 import json
-import re
-from typing import List, Optional
-from fastapi import FastAPI, Query
+import operator
+import os
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, Union
+from fastapi import FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import requests
-from datetime import datetime
-import akshare as ak
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+import aiohttp
+import numpy as np
+
+from dividend_store import DividendStore
+from history_store import HistoryStore, day_of, parse_time
+from metrics import RequestMetricsMiddleware, registry, timed
+from quote_stream import QuoteBroadcaster, compute_delta, encode_ndjson, encode_sse
+from quote_table import ROW_FIELDS, QuoteTable
+import fast_json
+from response_cache import ResponseCache, choose_encoding, etag_matches, make_etag
+from saved_screens import ScreenRegistry
+from shared_snapshot import SharedSnapshotReader, write_snapshot
+from strategy import StrategyError, get_strategy_predicate
+from universe import UniverseError, load_universe
+from upstream_guard import CircuitBreaker, TokenBucket
+from datetime import datetime, timedelta, timezone
+
+# 股票池（代码、板块）：启动时从数据文件加载，去重并校验交易所前缀
+UNIVERSE_FILE = os.environ.get(
+    'CIGAR_UNIVERSE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'universe.json'))
+universe = load_universe(UNIVERSE_FILE)
+
+# 市场 -> 股票代码列表（快照按市场缓存）
+MARKET_CODES = {
+    'a股': universe['a股'].codes,
+    '港股': universe['港股'].codes,
+    'indices': universe.indices,
+}
+
+# 快照刷新间隔（秒）：交易时段刷新较快，收盘后低频刷新
+REFRESH_INTERVAL_TRADING = float(os.environ.get('CIGAR_REFRESH_TRADING', 10))
+REFRESH_INTERVAL_IDLE = float(os.environ.get('CIGAR_REFRESH_IDLE', 300))
+
+# 上游行情抓取配置
+TENCENT_QUOTE_URL = os.environ.get('CIGAR_QUOTE_URL', 'https://qt.gtimg.cn/q=')
+FETCH_BATCH_SIZE = int(os.environ.get('CIGAR_FETCH_BATCH_SIZE', 60))     # 每批股票数
+FETCH_CONCURRENCY = int(os.environ.get('CIGAR_FETCH_CONCURRENCY', 8))    # 最大并发批次
+FETCH_TIMEOUT = float(os.environ.get('CIGAR_FETCH_TIMEOUT', 5))          # 单批超时（秒）
+FETCH_RETRIES = int(os.environ.get('CIGAR_FETCH_RETRIES', 2))            # 单批重试次数
+FETCH_BACKOFF = float(os.environ.get('CIGAR_FETCH_BACKOFF', 0.3))        # 重试退避基数（秒）
+
+# 上游保护：请求速率（每秒，0 表示不限）与突发量；连续失败次数达到阈值后熔断，冷却后探测恢复
+UPSTREAM_RATE = float(os.environ.get('CIGAR_UPSTREAM_RATE', 20))
+UPSTREAM_BURST = int(os.environ.get('CIGAR_UPSTREAM_BURST', 20))
+BREAKER_THRESHOLD = int(os.environ.get('CIGAR_BREAKER_THRESHOLD', 5))
+BREAKER_COOLDOWN = float(os.environ.get('CIGAR_BREAKER_COOLDOWN', 15))       # 首次熔断时长（秒）
+BREAKER_MAX_COOLDOWN = float(os.environ.get('CIGAR_BREAKER_MAX_COOLDOWN', 300))
+PROBE_INTERVAL = 1.0  # 检查是否需要探测的间隔（秒）
+
+# 冷启动（还没有任何快照）时请求最多等待上游的时间（秒），超时返回空结果，后台继续抓取
+COLD_START_WAIT = float(os.environ.get('CIGAR_COLD_START_WAIT', FETCH_TIMEOUT))
+
+# 启动预热：开始接受请求前先取到各市场的第一个快照，最多等待的秒数（0 表示不预热）
+WARMUP_TIMEOUT = float(os.environ.get('CIGAR_WARMUP_TIMEOUT', 15))
+
+# 历史快照存储：目录与最小记录间隔（秒，0 表示不记录）
+HISTORY_DIR = os.environ.get(
+    'CIGAR_HISTORY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'history'))
+HISTORY_INTERVAL = float(os.environ.get('CIGAR_HISTORY_INTERVAL', 60))
+
+# 保存的筛选定义文件（多 worker 部署时各 worker 共用，文件变化后重新加载）
+SCREENS_FILE = os.environ.get(
+    'CIGAR_SCREENS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'screens.json'))
+
+# 多 worker 部署：刷新进程把快照写入该目录，各 worker 通过 mmap 读取（未设置时单进程自行抓取）
+SHARED_DIR = os.environ.get('CIGAR_SHARED_DIR')
+SHARED_POLL_INTERVAL = float(os.environ.get('CIGAR_SHARED_POLL', 0.5))  # worker 检查新快照的间隔（秒）
+
+# 分红数据：磁盘缓存、离线文件（code,dps 的 CSV）、缓存有效期与检查间隔（秒）
+DIVIDEND_CACHE = os.environ.get(
+    'CIGAR_DIVIDEND_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'dividends.json'))
+DIVIDEND_FILE = os.environ.get('CIGAR_DIVIDEND_FILE')
+DIVIDEND_TTL = float(os.environ.get('CIGAR_DIVIDEND_TTL', 86400))
+DIVIDEND_CHECK_INTERVAL = float(os.environ.get('CIGAR_DIVIDEND_CHECK', 3600))
+DIVIDEND_RELOAD_INTERVAL = 60  # 多 worker 部署时 worker 检查分红缓存文件的间隔
+
+# 实时推送：每个连接最多积压的消息数、心跳间隔（秒）
+STREAM_QUEUE_SIZE = int(os.environ.get('CIGAR_STREAM_QUEUE', 16))
+STREAM_PING_INTERVAL = float(os.environ.get('CIGAR_STREAM_PING', 15))
+
+# 已序列化响应体的缓存上限（MB）
+RESPONSE_CACHE_MB = float(os.environ.get('CIGAR_RESPONSE_CACHE_MB', 64))
+
+# 响应头中附带各阶段耗时（Server-Timing），设为 0 关闭
+SERVER_TIMING = os.environ.get('CIGAR_SERVER_TIMING', '1') != '0'
+
+# 可排序字段（与前端表头 th[data-sort] 一致），每个快照预先建立排序索引
+SORT_FIELDS = ['code', 'name', 'price', 'changePercent', 'pe', 'pb', 'marketCap', 'dividendYield']
+SORT_PATTERN = '^(' + '|'.join(SORT_FIELDS) + ')$'
+SNAPSHOT_RETAIN = 4        # 每个市场保留的快照版本数（供游标分页翻页使用）
+ORDER_CACHE_SIZE = 256     # 缓存的 (快照版本, 查询) -> 结果行号 数量
+SECTOR_VIEW_CACHE_SIZE = 64  # 每个快照缓存的板块子表数量
+
+# 交易时段（北京时间/香港时间均为 UTC+8）
+MARKET_TZ = timezone(timedelta(hours=8))
+TRADING_SESSIONS = {
+    'a股': [((9, 15), (11, 30)), ((13, 0), (15, 0))],
+    '港股': [((9, 30), (12, 0)), ((13, 0), (16, 10))],
+}
+TRADING_SESSIONS['indices'] = TRADING_SESSIONS['a股'] + TRADING_SESSIONS['港股']
+
+
+# 腾讯行情字段位置 -> 数值列（只转换需要的字段）
+TENCENT_FIELD_INDEX = [
+    ('price', 3), ('previousClose', 4), ('open', 5), ('high', 33), ('low', 34),
+    ('volume', 6), ('change', 31), ('changePercent', 32), ('pe', 39), ('pb', 46),
+    ('marketCap', 45), ('floatMarketCap', 44), ('dividendYield', 64),
+    ('turnoverRate', 37), ('amplitude', 43),
+]
+_TENCENT_MAX_INDEX = max(i for _, i in TENCENT_FIELD_INDEX)
+_get_tencent_fields = operator.itemgetter(*(i for _, i in TENCENT_FIELD_INDEX))
+
+# 指数没有估值数据，这些列置 0
+INDEX_ZERO_FIELDS = ['pe', 'pb', 'marketCap', 'floatMarketCap', 'dividendYield', 'turnoverRate']
+INDEX_PREFIXES = ('sh000', 'sz399', 'hkHS')
+
+# 解析统计（替代逐行 print）
+parse_stats = {'records': 0, 'parsed': 0, 'tooShort': 0, 'badNumber': 0, 'truncated': 0}
+parse_errors_by_code: Counter = Counter()
+
+# 上游抓取指标：每次请求（含重试）的结果和耗时
+upstream_requests = registry.counter(
+    'cigar_upstream_requests_total', '上游行情请求数（含重试）：success / failure / timeout', ('result',))
+upstream_failed_batches = registry.counter('cigar_upstream_failed_batches_total', '重试后仍失败、被丢弃的批次数')
+upstream_batch_seconds = registry.histogram('cigar_upstream_batch_seconds', '单批上游请求耗时')
+
+
+def _record_parse_error(code: str, reason: str):
+    parse_stats[reason] += 1
+    parse_errors_by_code[code] += 1
+
+
+def parse_tencent_table(body: Union[bytes, str]) -> QuoteTable:
+    """
+    解析腾讯财经返回的数据，直接生成列式行情表
+    整个响应只解码一次，逐条记录按固定字段位置取值，数值列一次性批量转换
+    """
+    text = body.decode('gbk', errors='replace') if isinstance(body, bytes) else body
+
+    codes, names, flat = [], [], []
+    extend = flat.extend
+    width = _TENCENT_MAX_INDEX + 1
+
+    # 每条记录形如 v_sh600519="1~贵州茅台~600519~...";
+    records = text.split('";')
+    tail = records.pop()
+    if '="' in tail:
+        # 最后一条记录没有结束符：响应被截断
+        _record_parse_error(tail[tail.find('v_') + 2:tail.find('="')], 'truncated')
+
+    for record in records:
+        prefix, sep, body = record.partition('="')
+        if not sep:
+            continue
+        code = prefix[prefix.rfind('v_') + 2:]
+        data = body.split('~', width)
+        parse_stats['records'] += 1
+
+        if len(data) < 10:
+            _record_parse_error(code, 'tooShort')
+            continue
+        if len(data) < width:
+            data.extend([''] * (width - len(data)))
+
+        extend(_get_tencent_fields(data))
+        codes.append(code)
+        names.append(data[1])
+
+    n_fields = len(TENCENT_FIELD_INDEX)
+    try:
+        values = np.array([v or '0' for v in flat], dtype=np.float64).reshape(-1, n_fields)
+    except ValueError:
+        # 存在非法数值：逐行转换，丢弃出错的行
+        values, keep = _convert_rows_slow(codes, flat, n_fields)
+        codes = [codes[i] for i in keep]
+        names = [names[i] for i in keep]
+
+    parse_stats['parsed'] += len(codes)
+    # 转置为按列连续存储，并按原接口约定处理单位
+    values = np.ascontiguousarray(values.T)
+    columns = {field: values[j] for j, (field, _) in enumerate(TENCENT_FIELD_INDEX)}
+    columns['volume'] = columns['volume'].astype(np.int64)
+    columns['marketCap'] = np.round(columns['marketCap'], 2)  # 已经是亿
+    columns['floatMarketCap'] = np.round(columns['floatMarketCap'], 2)  # 已经是亿
+    columns['dividendYield'] /= 100  # 股息率(%), 转为小数
+
+    codes = np.array(codes, dtype=object)
+    if len(codes):
+        is_index = np.fromiter((c.startswith(INDEX_PREFIXES) for c in codes), dtype=bool, count=len(codes))
+        if is_index.any():
+            for field in INDEX_ZERO_FIELDS:
+                columns[field][is_index] = 0
+
+    return QuoteTable(codes, np.array(names, dtype=object), columns)
+
+
+def _convert_rows_slow(codes: List[str], flat: List[str], n_fields: int):
+    rows, keep = [], []
+    for i, code in enumerate(codes):
+        try:
+            rows.append([float(v) if v else 0.0 for v in flat[i * n_fields:(i + 1) * n_fields]])
+            keep.append(i)
+        except ValueError:
+            _record_parse_error(code, 'badNumber')
+    values = np.array(rows, dtype=np.float64).reshape(-1, n_fields)
+    return values, keep
+
+
+def parse_tencent_data(text: str) -> List[dict]:
+    """解析腾讯财经返回的数据（返回 dict 列表）"""
+    table = parse_tencent_table(text)
+    return table.rows(range(len(table)))
+
+
+# 共享的异步 HTTP 客户端（在 lifespan 中创建，所有请求复用连接池）
+http_client: Optional[aiohttp.ClientSession] = None
+fetch_semaphore: Optional[asyncio.Semaphore] = None
+
+upstream_limiter = TokenBucket(UPSTREAM_RATE, UPSTREAM_BURST)
+upstream_breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN, BREAKER_MAX_COOLDOWN)
+
+
+def create_http_client() -> aiohttp.ClientSession:
+    """创建带连接池的异步 HTTP 客户端（keep-alive 复用连接）"""
+    return aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT),
+        connector=aiohttp.TCPConnector(limit=FETCH_CONCURRENCY),
+    )
+
+
+async def fetch_quote_batch(client: aiohttp.ClientSession, codes: List[str],
+                            semaphore: asyncio.Semaphore) -> bytes:
+    """获取一批股票行情的原始响应体，失败时按指数退避重试；熔断期间直接返回空"""
+    url = TENCENT_QUOTE_URL + ','.join(codes)
+
+    for attempt in range(FETCH_RETRIES + 1):
+        if not upstream_breaker.allow():
+            # 重试过程中熔断：放弃本批，不再等待
+            upstream_requests.inc('rejected')
+            return b''
+
+        result = 'failure'
+        try:
+            await upstream_limiter.acquire()
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    async with client.get(url) as response:
+                        if response.status == 200:
+                            body = await response.read()
+                            result = 'success'
+                            return body
+                        error = f"HTTP {response.status}"
+                finally:
+                    upstream_batch_seconds.observe(time.perf_counter() - start)
+        except asyncio.TimeoutError as e:
+            result, error = 'timeout', repr(e)
+        except Exception as e:
+            error = repr(e)
+        finally:
+            upstream_requests.inc(result)
+            if result == 'success':
+                upstream_breaker.record_success()
+            else:
+                upstream_breaker.record_failure()
+
+        if attempt < FETCH_RETRIES:
+            await asyncio.sleep(FETCH_BACKOFF * (2 ** attempt))
+
+    upstream_failed_batches.inc()
+    print(f"获取腾讯行情失败 ({codes[0]} 等 {len(codes)} 只): {error}")
+    return b''
+
+
+async def probe_upstream(client: aiohttp.ClientSession) -> bool:
+    """探测上游是否恢复：只请求一个指数，能正常解析即视为恢复"""
+    try:
+        await upstream_limiter.acquire()
+        async with client.get(TENCENT_QUOTE_URL + MARKET_CODES['indices'][0]) as response:
+            body = await response.read()
+        return response.status == 200 and len(parse_tencent_table(body)) > 0
+    except Exception:
+        return False
+
+
+async def upstream_probe_loop(store: 'SnapshotStore'):
+    """熔断后按冷却时间探测上游，恢复后立即刷新所有市场"""
+    while True:
+        await asyncio.sleep(PROBE_INTERVAL)
+        if not upstream_breaker.probe_due():
+            continue
+        ok = await probe_upstream(http_client)
+        upstream_breaker.record_probe(ok)
+        if ok:
+            for market in store.markets:
+                store.revalidate(market)
+
+
+async def fetch_quote_batches(codes: List[str],
+                              client: Optional[aiohttp.ClientSession] = None) -> List[Tuple[List[str], bytes]]:
+    """分批并发获取原始响应体，返回 [(该批代码, 响应体)]；失败的批次响应体为空，熔断期间返回空列表"""
+    if not codes:
+        return []
+
+    client = client or http_client
+    if client is None:
+        # 未在服务内运行（脚本调用等），使用临时客户端
+        async with create_http_client() as temp_client:
+            return await fetch_quote_batches(codes, temp_client)
+
+    if not upstream_breaker.allow():
+        # 熔断期间不访问上游，由调用方继续使用上一次的有效快照
+        return []
+
+    semaphore = fetch_semaphore or asyncio.Semaphore(FETCH_CONCURRENCY)
+    batches = [codes[i:i + FETCH_BATCH_SIZE] for i in range(0, len(codes), FETCH_BATCH_SIZE)]
+    with timed('upstream'):
+        bodies = await asyncio.gather(*(fetch_quote_batch(client, batch, semaphore) for batch in batches))
+    return list(zip(batches, bodies))
+
+
+def is_truncated(body: bytes, last_code: str) -> bool:
+    """
+    响应体是否被截断（HTTP 200 但传输中途断开）：
+    最后一个记录结束符之后还有内容（最后一条记录不完整），或者缺少本批最后一只股票的记录（恰好断在记录之间）
+    """
+    end = body.rfind(b'";')
+    if end < 0 or body[end + 2:].strip():
+        return True
+    return b'v_' + last_code.encode() + b'="' not in body[body.rfind(b'v_', 0, end):]
+
+
+def parse_quote_batches(batches: List[Tuple[List[str], bytes]]) -> Tuple[QuoteTable, List[str]]:
+    """
+    逐批解析后按批次顺序拼接，返回 (行情表, 失败批次中没有取到的代码)
+    每批单独解析，截断的记录不会与下一批的开头拼在一起；
+    请求失败或响应被截断的批次视为失败，其中缺失的股票由调用方沿用上一个快照
+    """
+    tables, failed = [], []
+    for batch, body in batches:
+        if not body:
+            failed.extend(batch)
+            continue
+        table = parse_tencent_table(body)
+        tables.append(table)
+        if is_truncated(body, batch[-1]):
+            parsed = table.index
+            failed.extend(code for code in batch if code not in parsed)
+
+    if not tables:
+        return QuoteTable.empty(), failed
+    if len(tables) == 1:
+        return tables[0], failed
+    return QuoteTable.concat(tables), failed
+
+
+async def fetch_tencent_quotes(codes: List[str],
+                               client: Optional[aiohttp.ClientSession] = None) -> QuoteTable:
+    """从腾讯财经获取行情（分批并发获取，单批失败不影响其他批次）"""
+    batches = await fetch_quote_batches(codes, client)
+    with timed('parse'):
+        table, _ = parse_quote_batches(batches)
+    return table
+
+
+async def fetch_market_quotes(codes: List[str], previous: Optional[QuoteTable]) -> Tuple[QuoteTable, int]:
+    """
+    抓取一个市场的行情，返回 (行情表, 沿用的股票数)
+    部分批次失败时这些股票沿用上一个快照中的行，股票列表和顺序保持不变（不让结果和总数缩水，
+    推送和保存的筛选仍可逐只比较）；全部失败时返回空表，由调用方保留上一个快照
+    """
+    batches = await fetch_quote_batches(codes)
+    with timed('parse'):
+        table, failed = parse_quote_batches(batches)
+
+    if not failed or previous is None or not len(table):
+        return table, 0
+    index = previous.index
+    carried = [index[code] for code in failed if code in index]
+    if not carried:
+        return table, 0
+
+    merged = QuoteTable.concat([table, previous.take(np.array(carried, dtype=np.intp))])
+    position = {code: i for i, code in enumerate(codes)}
+    order = np.argsort(np.fromiter((position.get(code, len(codes)) for code in merged.codes),
+                                   dtype=np.int64, count=len(merged)), kind='stable')
+    return merged.take(order), len(carried)
+
+
+# 分红数据（每股分红的内存索引，后台按日增量刷新）
+dividend_store = DividendStore(DIVIDEND_CACHE, ttl=DIVIDEND_TTL, local_file=DIVIDEND_FILE)
+
+
+def enrich_with_dividend_yield(table: QuoteTable) -> QuoteTable:
+    """按分红数据计算股息率（返回替换了股息率列的新表，其余列共享）；没有分红数据时保留行情自带的股息率"""
+    values = dividend_store.yields(table.codes, table['price'], table['dividendYield'])
+    return table.with_column('dividendYield', values)
+
+
+async def dividend_refresh_loop(reload_only: bool = False):
+    """
+    后台定时检查分红数据是否过期（拉取在线程池中进行，不阻塞事件循环）
+    reload_only: 多 worker 部署的 worker 不拉取，只在刷新进程更新缓存文件后重新加载
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            if reload_only:
+                dividend_store.reload_if_changed()
+            elif await loop.run_in_executor(None, dividend_store.refresh):
+                print(f"分红数据已更新: {len(dividend_store)} 只股票")
+        except Exception as e:
+            print(f"刷新分红数据失败: {e}")
+        await asyncio.sleep(DIVIDEND_RELOAD_INTERVAL if reload_only else DIVIDEND_CHECK_INTERVAL)
+
+
+def is_trading_time(market: str, now: Optional[datetime] = None) -> bool:
+    """判断市场当前是否处于交易时段"""
+    now = now or datetime.now(MARKET_TZ)
+    if now.weekday() >= 5:
+        return False
+    hm = (now.hour, now.minute)
+    return any(start <= hm <= end for start, end in TRADING_SESSIONS.get(market, []))
+
+
+def refresh_interval(market: str) -> float:
+    """当前时刻该市场快照的刷新间隔（秒）"""
+    return REFRESH_INTERVAL_TRADING if is_trading_time(market) else REFRESH_INTERVAL_IDLE
+
+
+def format_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class MarketSnapshot:
+    """某一市场在某一时刻的完整行情快照（只读，多个请求共享）"""
+
+    __slots__ = ('market', 'table', 'fetched_at', 'version', 'carried', '_enriched', '_enriched_version',
+                 '_sectors', '_views')
+
+    def __init__(self, market: str, table: QuoteTable, fetched_at: float, version: int, carried: int = 0):
+        self.market = market
+        self.table = table
+        self.fetched_at = fetched_at
+        self.version = version
+        self.carried = carried  # 部分批次抓取失败时沿用上一快照数据的股票数
+        self._enriched: Optional[QuoteTable] = None
+        self._enriched_version = -1
+        self._sectors: Optional[np.ndarray] = None
+        self._views: Dict[tuple, QuoteTable] = {}
+
+    @property
+    def enriched(self) -> QuoteTable:
+        """补充股息率后的行情表（每个快照只计算一次，分红数据更新后重新计算）"""
+        if self._enriched is None or self._enriched_version != dividend_store.version:
+            self._enriched_version = dividend_store.version
+            with timed('enrich'):
+                self._enriched = enrich_with_dividend_yield(self.table)
+        return self._enriched
+
+    def view(self, sector_ids: Tuple[int, ...] = (), enriched: bool = False) -> QuoteTable:
+        """
+        只包含指定板块股票的子表（按快照缓存），之后的筛选和排序只涉及这些股票
+        不指定板块时返回整张表
+        """
+        table = self.enriched if enriched else self.table
+        if not sector_ids:
+            return table
+
+        key = (enriched, self._enriched_version if enriched else None, sector_ids)
+        view = self._views.get(key)
+        if view is None:
+            if self._sectors is None:
+                self._sectors = universe[self.market].sector_column(self.table.codes)
+            view = table.take(np.flatnonzero(np.isin(self._sectors, sector_ids)))
+            if len(self._views) >= SECTOR_VIEW_CACHE_SIZE:
+                self._views.clear()
+            self._views[key] = view
+        return view
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class SnapshotStore:
+    """
+    进程内共享的行情快照缓存
+    - 后台任务按市场定时刷新
+    - 冷启动未命中时合并请求：同一市场同时只有一次上游抓取，其他请求等待其结果
+    - 指定 reader 时（多 worker 部署）不访问上游，只读取刷新进程发布的共享快照
+    """
+
+    def __init__(self, markets: Dict[str, List[str]], reader: Optional[SharedSnapshotReader] = None,
+                 first_version: int = 0):
+        self.markets = markets
+        self.reader = reader
+        self._snapshots: Dict[str, MarketSnapshot] = {}
+        self._retained: Dict[str, 'OrderedDict[int, MarketSnapshot]'] = {m: OrderedDict() for m in markets}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._listeners: List[Callable[[MarketSnapshot, Optional[MarketSnapshot]], None]] = []
+        self._version = first_version
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'staleServed': 0,
+            'refreshes': 0,
+            'refreshErrors': 0,
+            'partialRefreshes': 0,
+            'lastRefreshMs': 0.0,
+            'totalRefreshMs': 0.0,
+        }
+
+    def max_age(self, market: str) -> float:
+        """快照最大可用时长，超过则视为未命中"""
+        return refresh_interval(market) * 2
+
+    async def get(self, market: str) -> MarketSnapshot:
+        """
+        获取市场快照，请求不会等待上游：
+        - 快照过期时立即返回旧快照（响应中标记 stale），同时在后台刷新
+        - 只有冷启动（还没有快照）时等待抓取，最多 COLD_START_WAIT 秒
+        """
+        snapshot = self._snapshots.get(market)
+        if snapshot is not None:
+            if snapshot.age <= self.max_age(market):
+                self.stats['hits'] += 1
+            else:
+                self.stats['staleServed'] += 1
+                self.revalidate(market)
+            return snapshot
+
+        self.stats['misses'] += 1
+        try:
+            return await asyncio.wait_for(self.refresh(market), COLD_START_WAIT)
+        except asyncio.TimeoutError:
+            return MarketSnapshot(market, QuoteTable.empty(), time.time(), 0)
+
+    def is_stale(self, snapshot: MarketSnapshot) -> bool:
+        """快照超过最大可用时长、上游熔断中（暂时无法刷新），或部分股票沿用了上一快照的数据"""
+        return bool(snapshot.version) and (snapshot.age > self.max_age(snapshot.market)
+                                           or not upstream_breaker.closed or snapshot.carried > 0)
+
+    def _start_fetch(self, market: str) -> asyncio.Task:
+        task = self._inflight.get(market)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(market))
+            self._inflight[market] = task
+            task.add_done_callback(lambda t: self._fetch_done(market, t))
+        return task
+
+    def _fetch_done(self, market: str, task: asyncio.Task):
+        self._inflight.pop(market, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats['refreshErrors'] += 1
+            print(f"刷新 {market} 快照失败: {task.exception()}")
+
+    async def refresh(self, market: str) -> MarketSnapshot:
+        """刷新市场快照；已有进行中的刷新时直接等待其结果"""
+        return await asyncio.shield(self._start_fetch(market))
+
+    def revalidate(self, market: str):
+        """在后台刷新快照（不等待结果）"""
+        self._start_fetch(market)
+
+    async def _fetch(self, market: str) -> MarketSnapshot:
+        if self.reader is not None:
+            return await self._load_shared(market)
+
+        start = time.perf_counter()
+        previous = self._snapshots.get(market)
+        table, carried = await fetch_market_quotes(self.markets[market], previous.table if previous else None)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        self.stats['refreshes'] += 1
+        self.stats['lastRefreshMs'] = round(elapsed_ms, 1)
+        self.stats['totalRefreshMs'] += elapsed_ms
+
+        if not len(table):
+            # 上游失败时保留上一次的有效快照，不用空数据覆盖
+            self.stats['refreshErrors'] += 1
+            if previous is not None:
+                return previous
+            return MarketSnapshot(market, QuoteTable.empty(), time.time(), 0)
+
+        if carried:
+            self.stats['partialRefreshes'] += 1
+            print(f"刷新 {market} 快照时部分批次失败，{carried} 只股票沿用上一快照的数据")
+        self._version += 1
+        return self._publish(MarketSnapshot(market, table, time.time(), self._version, carried), previous)
+
+    async def _load_shared(self, market: str) -> MarketSnapshot:
+        """读取共享快照；刷新进程还没写出第一个快照时最多等待一个抓取超时"""
+        deadline = time.time() + FETCH_TIMEOUT
+        while True:
+            shared = self.reader.poll(market)
+            previous = self._snapshots.get(market)
+            if shared is not None:
+                table, version, fetched_at, carried = shared
+                return self._publish(MarketSnapshot(market, table, fetched_at, version, carried), previous)
+            if previous is not None:
+                return previous
+            if time.time() >= deadline:
+                return MarketSnapshot(market, QuoteTable.empty(), time.time(), 0)
+            await asyncio.sleep(0.1)
+
+    def _publish(self, snapshot: MarketSnapshot, previous: Optional[MarketSnapshot]) -> MarketSnapshot:
+        market = snapshot.market
+        self._snapshots[market] = snapshot
+
+        retained = self._retained[market]
+        retained[snapshot.version] = snapshot
+        while len(retained) > SNAPSHOT_RETAIN:
+            retained.popitem(last=False)
+
+        for listener in self._listeners:
+            try:
+                listener(snapshot, previous)
+            except Exception as e:
+                print(f"快照回调 {listener.__name__} 失败: {e}")
+        return snapshot
+
+    async def warm_up(self, timeout: float) -> bool:
+        """
+        等待各市场的第一个快照（与后台刷新任务共用同一次抓取），超时返回 False
+        单次抓取或读取共享快照没有结果（上游失败、刷新进程还没写出快照）时继续重试，直到超时
+        """
+        deadline = time.monotonic() + timeout
+        while not self.ready():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            pending = [m for m in self.markets if not self.has_snapshot(m)]
+            try:
+                await asyncio.wait_for(asyncio.gather(*(self.refresh(m) for m in pending)), remaining)
+            except asyncio.TimeoutError:
+                return self.ready()
+            except Exception as e:
+                print(f"预热快照失败: {e}")
+            if not self.ready():
+                await asyncio.sleep(min(0.2, max(0.0, deadline - time.monotonic())))
+        return True
+
+    def has_snapshot(self, market: str) -> bool:
+        snapshot = self._snapshots.get(market)
+        return snapshot is not None and bool(snapshot.version)
+
+    def ready(self) -> bool:
+        """各市场都已有有效快照"""
+        return all(self.has_snapshot(m) for m in self.markets)
+
+    def latest(self) -> Dict[str, MarketSnapshot]:
+        """各市场当前的快照"""
+        return dict(self._snapshots)
+
+    def get_version(self, market: str, version: int) -> Optional[MarketSnapshot]:
+        """按版本号取最近保留的快照，已淘汰时返回 None"""
+        return self._retained.get(market, {}).get(version)
+
+    async def find_version(self, market: str, version: int) -> Optional[MarketSnapshot]:
+        """
+        按版本号取快照；多 worker 部署时其他 worker 可能已经发出了本 worker 还没轮询到的新版本的游标，
+        版本比当前快照新时立即读取一次共享快照再查找
+        """
+        snapshot = self.get_version(market, version)
+        if snapshot is None and self.reader is not None:
+            latest = self._snapshots.get(market)
+            if latest is None or version > latest.version:
+                await self.refresh(market)
+                snapshot = self.get_version(market, version)
+        return snapshot
+
+    def add_listener(self, listener: Callable[[MarketSnapshot, Optional[MarketSnapshot]], None]):
+        """注册快照刷新回调：listener(新快照, 上一个快照)"""
+        self._listeners.append(listener)
+
+    async def _refresh_loop(self, market: str):
+        while True:
+            try:
+                await self.refresh(market)
+            except Exception:
+                pass  # 已在 _fetch_done 中记录
+            await asyncio.sleep(SHARED_POLL_INTERVAL if self.reader is not None else refresh_interval(market))
+
+    def start(self):
+        """启动后台刷新任务"""
+        self._tasks = [asyncio.ensure_future(self._refresh_loop(m)) for m in self.markets]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot_stats(self) -> dict:
+        refreshes = self.stats['refreshes']
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'totalRefreshMs': round(self.stats['totalRefreshMs'], 1),
+            'avgRefreshMs': round(self.stats['totalRefreshMs'] / refreshes, 1) if refreshes else 0,
+            'hitRatio': round(self.stats['hits'] / lookups, 4) if lookups else 0,
+            'markets': {
+                market: {
+                    'version': snap.version,
+                    'count': len(snap.table),
+                    'age': round(snap.age, 1),
+                    'carried': snap.carried,
+                    'updateTime': format_time(snap.fetched_at),
+                }
+                for market, snap in self._snapshots.items()
+            },
+        }
+
+
+# 版本号按时间起算：进程重启后版本仍然递增，客户端带着旧的 Last-Event-ID / 游标重连时不会误认为同一版本
+snapshot_store = SnapshotStore(MARKET_CODES, reader=SharedSnapshotReader(SHARED_DIR) if SHARED_DIR else None,
+                               first_version=int(time.time() * 1000))
+history_store = HistoryStore(HISTORY_DIR)
+
+# 市场 -> (上次写入历史的时间, 写入时是否在交易时段)
+_history_last_write: Dict[str, tuple] = {}
+
+
+def record_history(snapshot: MarketSnapshot, previous: Optional[MarketSnapshot]):
+    """
+    把刷新后的快照写入历史存储（按最小间隔抽样，收盘后只记录一次）
+    部分股票沿用了上一快照数据的快照不记录，等下一个完整的快照
+    """
+    market = snapshot.market
+    if HISTORY_INTERVAL <= 0 or market == 'indices' or snapshot.carried:
+        return
+
+    last_ts, last_trading = _history_last_write.get(market, (0.0, True))
+    if snapshot.fetched_at - last_ts < HISTORY_INTERVAL:
+        return
+
+    trading = is_trading_time(market)
+    if not trading and not last_trading and day_of(last_ts) == day_of(snapshot.fetched_at):
+        return
+
+    history_store.append(market, snapshot.table, snapshot.fetched_at)
+    _history_last_write[market] = (snapshot.fetched_at, trading)
+
+
+def build_rank_indexes(snapshot: MarketSnapshot, previous: Optional[MarketSnapshot]):
+    """新快照生成后预先建立各排序字段的升序/降序索引"""
+    if snapshot.market == 'indices':
+        return
+    for table in (snapshot.table, snapshot.enriched):
+        for field in SORT_FIELDS:
+            table.argsort(field)
+            table.argsort(field, descending=True)
+
+
+quote_broadcaster = QuoteBroadcaster(STREAM_QUEUE_SIZE)
+
+
+def publish_quote_changes(snapshot: MarketSnapshot, previous: Optional[MarketSnapshot]):
+    """把本次刷新相对上一快照的变化推送给实时连接（没有连接时不计算）"""
+    if not quote_broadcaster.has_subscribers(snapshot.market):
+        return
+    changes = compute_delta(previous.enriched, snapshot.enriched) if previous else None
+    quote_broadcaster.publish(snapshot.market, snapshot.version, previous.version if previous else 0,
+                              format_time(snapshot.fetched_at), changes)
+
+
+def publish_shared_snapshot(snapshot: MarketSnapshot, previous: Optional[MarketSnapshot]):
+    """刷新进程：把新快照写入共享目录，供各 worker 读取"""
+    write_snapshot(SHARED_DIR, snapshot.market, snapshot.table, snapshot.version, snapshot.fetched_at,
+                   snapshot.carried)
+
+
+def compile_screen(definition: dict) -> Callable[[QuoteTable], np.ndarray]:
+    """保存的筛选定义 -> 逐行谓词（烟蒂股参数或自定义策略，可限定板块）"""
+    market = definition['market']
+    if 'strategy' in definition:
+        predicate = get_strategy_predicate(definition['strategy'])[1]
+    else:
+        conditions = definition['filter']
+        predicate = lambda table: cigar_butt_mask(table, **conditions)
+
+    sector_ids = universe[market].sector_ids(definition['sectors']) if definition.get('sectors') else ()
+    if not sector_ids:
+        return predicate
+
+    def in_sectors(table: QuoteTable) -> np.ndarray:
+        return predicate(table) & np.isin(universe[market].sector_column(table.codes), sector_ids)
+    return in_sectors
+
+
+screen_registry = ScreenRegistry(SCREENS_FILE, compile_screen)
+
+
+def update_saved_screens(snapshot: MarketSnapshot, previous: Optional[MarketSnapshot]):
+    """新快照生成后增量更新保存的筛选：只对有变化的股票重新求值"""
+    if snapshot.market == 'indices':
+        return
+    screen_registry.reload_if_changed()
+    screen_registry.update(
+        snapshot.market, snapshot.enriched, snapshot.version,
+        previous.enriched if previous is not None else None, previous.version if previous is not None else 0,
+        dividend_store.version, format_time(snapshot.fetched_at))
+
+
+snapshot_store.add_listener(build_rank_indexes)
+snapshot_store.add_listener(publish_quote_changes)
+snapshot_store.add_listener(update_saved_screens)
+if not SHARED_DIR:
+    # 多 worker 部署时历史由刷新进程统一记录
+    snapshot_store.add_listener(record_history)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client, fetch_semaphore
+    http_client = create_http_client()
+    fetch_semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+    dividend_store.load()
+    screen_registry.load()
+    snapshot_store.start()
+    # 多 worker 部署时 worker 不访问上游，由刷新进程负责探测
+    probe_task = asyncio.ensure_future(upstream_probe_loop(snapshot_store)) if not SHARED_DIR else None
+    if WARMUP_TIMEOUT > 0:
+        # 预热完成前不接受请求（多 worker 时请求由其他 worker 处理），首批请求不会遇到冷启动
+        start = time.perf_counter()
+        ready = await snapshot_store.warm_up(WARMUP_TIMEOUT)
+        print(f"快照预热{'完成' if ready else '超时，先以未就绪状态启动'}，耗时 {time.perf_counter() - start:.1f} 秒")
+    # 预热之后才开始检查分红数据：没有磁盘缓存时首次拉取会导入 akshare，不与预热争抢启动时间
+    dividend_task = asyncio.ensure_future(dividend_refresh_loop(reload_only=SHARED_DIR is not None))
+    yield
+    if probe_task is not None:
+        probe_task.cancel()
+    dividend_task.cancel()
+    await snapshot_store.stop()
+    await http_client.close()
+    http_client = None
+
 
 app = FastAPI(
     title="烟蒂股筛选器 API",
     description="代理腾讯财经 API 提供实时股票数据",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # 允许跨域
@@ -28,430 +873,587 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# A股主要股票代码 - 扩展版 (约500只)
-A_STOCK_CODES = [
-    # ========== 金融 (60只) ==========
-    # 银行
-    'sh601398', 'sh601288', 'sh601988', 'sh601328', 'sh600036',  # 五大行
-    'sh601166', 'sh601818', 'sh600016', 'sh601998', 'sh601169',
-    'sh601229', 'sh600919', 'sh601009', 'sh601077', 'sh601838',
-    'sh601997', 'sh601128', 'sh002142', 'sh600926', 'sh601577',
-    'sh601860', 'sh601665', 'sh601963', 'sh601528', 'sh600015',
-    'sh601187', 'sh601825', 'sh601916', 'sh601665', 'sh601963',
-    'sh600928', 'sh601528', 'sh601825', 'sh601916', 'sh601665',
-    # 保险
-    'sh601318', 'sh601628', 'sh601601', 'sh601336', 'sh601319',
-    'sh601456', 'sh601238', 'sh601336', 'sh601319', 'sh601456',
-    # 证券
-    'sh600030', 'sh601688', 'sh600837', 'sh601211', 'sh601881',
-    'sh601377', 'sh601901', 'sh601788', 'sh601555', 'sh600958',
-    'sh601696', 'sh601066', 'sh601236', 'sh601456', 'sh601696',
-    'sh600999', 'sh601878', 'sh601990', 'sh601108', 'sh601198',
-    'sh600109', 'sh601375', 'sh002797', 'sh002673', 'sh002500',
-    # 多元金融
-    'sh600705', 'sh600390', 'sh600816', 'sh600643', 'sh000567',
-
-    # ========== 能源 (40只) ==========
-    # 石油
-    'sh601857', 'sh600028', 'sh601088', 'sh600938', 'sh601225',
-    'sh601808', 'sh600871', 'sh600256', 'sh600339', 'sh601015',
-    # 煤炭
-    'sh601088', 'sh601225', 'sh601898', 'sh601699', 'sh600188',
-    'sh601015', 'sh600123', 'sh601699', 'sh601666', 'sh600971',
-    'sh600408', 'sh600508', 'sh601001', 'sh601699', 'sh600157',
-    # 电力
-    'sh600900', 'sh601985', 'sh600886', 'sh600795', 'sh601991',
-    'sh600027', 'sh600011', 'sh601016', 'sh600023', 'sh600021',
-    'sh601222', 'sh600642', 'sh600578', 'sh600863', 'sh601619',
-
-    # ========== 地产 (50只) ==========
-    'sz000002', 'sh600048', 'sh001979', 'sh600606', 'sh600340',
-    'sh601155', 'sh600383', 'sh600208', 'sh600185', 'sh600565',
-    'sh600657', 'sh600639', 'sh600663', 'sh600648', 'sh600638',
-    'sh600895', 'sh600064', 'sh600736', 'sh600325', 'sh600266',
-    'sh600376', 'sh600675', 'sh600724', 'sh600791', 'sh600322',
-    'sh600223', 'sh600067', 'sh600159', 'sh600173', 'sh600510',
-    'sh600533', 'sh600716', 'sh600743', 'sh600077', 'sh600162',
-    'sh600239', 'sh600684', 'sh600696', 'sh600724', 'sh600748',
-    'sh600890', 'sh600095', 'sh600503', 'sh600621', 'sh600638',
-    'sh600665', 'sh600684', 'sh600696', 'sh600748', 'sh600890',
-
-    # ========== 消费 - 白酒 (20只) ==========
-    'sh600519', 'sz000858', 'sz000568', 'sh600809', 'sz002304',
-    'sh600702', 'sh600779', 'sh600199', 'sh600559', 'sh600197',
-    'sh600238', 'sh600365', 'sh600696', 'sh600702', 'sh600779',
-    'sh600199', 'sh600559', 'sh600197', 'sh600238', 'sh600365',
-
-    # ========== 消费 - 食品 (30只) ==========
-    'sh600887', 'sh603288', 'sh600276', 'sh600436', 'sz000538',
-    'sh600305', 'sh600298', 'sh600186', 'sh600872', 'sh600597',
-    'sh600419', 'sh600429', 'sh600737', 'sh600108', 'sh600251',
-    'sh600540', 'sh600962', 'sh600313', 'sh600371', 'sh600598',
-    'sh600965', 'sh600975', 'sh600201', 'sh600195', 'sh600359',
-    'sh600506', 'sh600540', 'sh600962', 'sh600313', 'sh600371',
-
-    # ========== 医药 (50只) ==========
-    'sh600276', 'sh600436', 'sz000538', 'sh600079', 'sh600521',
-    'sh600196', 'sh600380', 'sh600420', 'sh600062', 'sh600267',
-    'sh600488', 'sh600513', 'sh600557', 'sh600572', 'sh600594',
-    'sh600664', 'sh600750', 'sh600789', 'sh600812', 'sh600829',
-    'sh600849', 'sh600851', 'sh600867', 'sh600976', 'sh600993',
-    'sh601607', 'sh603259', 'sh603392', 'sh603590', 'sh603658',
-    'sh603939', 'sh688180', 'sh688185', 'sh688202', 'sh688266',
-    'sh688276', 'sh688331', 'sh688338', 'sh688356', 'sh688382',
-    'sh688428', 'sh688488', 'sh688520', 'sh688578', 'sh688617',
-    'sh688658', 'sh688687', 'sh688739', 'sh688799', 'sh688819',
-
-    # ========== 科技 - 半导体 (40只) ==========
-    'sh603893', 'sh600584', 'sh603501', 'sh600745', 'sh603986',
-    'sh688012', 'sh688981', 'sh688008', 'sh688396', 'sh688126',
-    'sh688019', 'sh688368', 'sh688595', 'sh688521', 'sh688072',
-    'sh688047', 'sh688110', 'sh688141', 'sh688172', 'sh688206',
-    'sh688220', 'sh688234', 'sh688249', 'sh688262', 'sh688270',
-    'sh688296', 'sh688308', 'sh688347', 'sh688361', 'sh688372',
-    'sh688403', 'sh688409', 'sh688416', 'sh688432', 'sh688439',
-    'sh688469', 'sh688486', 'sh688507', 'sh688525', 'sh688536',
-
-    # ========== 科技 - 软件/IT (40只) ==========
-    'sh600570', 'sh603019', 'sh600498', 'sh600100', 'sz000938',
-    'sh600536', 'sh603927', 'sh600756', 'sh600728', 'sh600718',
-    'sh600845', 'sh600410', 'sh600446', 'sh600476', 'sh600536',
-    'sh600570', 'sh600571', 'sh600588', 'sh600601', 'sh600728',
-    'sh600756', 'sh600845', 'sh600850', 'sh600855', 'sh600879',
-    'sh600895', 'sh600936', 'sh601360', 'sh601519', 'sh603000',
-    'sh603019', 'sh603039', 'sh603138', 'sh603160', 'sh603232',
-    'sh603383', 'sh603496', 'sh603636', 'sh603881', 'sh603927',
-
-    # ========== 制造 - 家电 (20只) ==========
-    'sz000333', 'sz000651', 'sh600690', 'sh603486', 'sh603195',
-    'sh603868', 'sh600060', 'sh600690', 'sh600839', 'sh600983',
-    'sh603355', 'sh603366', 'sh603486', 'sh603515', 'sh603579',
-    'sh603677', 'sh603868', 'sh688169', 'sh688696', 'sh688793',
-
-    # ========== 制造 - 机械 (30只) ==========
-    'sh600031', 'sh600169', 'sh600262', 'sh600320', 'sh600388',
-    'sh600495', 'sh600582', 'sh600710', 'sh600761', 'sh600815',
-    'sh600835', 'sh600843', 'sh600862', 'sh601100', 'sh601766',
-    'sh601989', 'sh603029', 'sh603111', 'sh603298', 'sh603338',
-    'sh603416', 'sh603486', 'sh603611', 'sh603638', 'sh603677',
-    'sh603690', 'sh603768', 'sh603901', 'sh688022', 'sh688257',
-
-    # ========== 基建 (40只) ==========
-    'sh601668', 'sh601390', 'sh601800', 'sh601669', 'sh601186',
-    'sh601117', 'sh601618', 'sh600170', 'sh600820', 'sh600528',
-    'sh600068', 'sh600170', 'sh600263', 'sh600284', 'sh600326',
-    'sh600350', 'sh600477', 'sh600491', 'sh600502', 'sh600512',
-    'sh600545', 'sh600583', 'sh600820', 'sh600853', 'sh600970',
-    'sh600986', 'sh601113', 'sh601188', 'sh601390', 'sh601611',
-    'sh601618', 'sh601668', 'sh601669', 'sh601800', 'sh601886',
-    'sh601989', 'sh603007', 'sh603017', 'sh603018', 'sh603357',
-
-    # ========== 汽车 (40只) ==========
-    'sh601633', 'sh600104', 'sh601238', 'sz000625', 'sh600660',
-    'sh601799', 'sh603596', 'sh600741', 'sz000581', 'sh601689',
-    'sh600066', 'sh600178', 'sh600303', 'sh600418', 'sh600609',
-    'sh600686', 'sh600742', 'sh600933', 'sh601127', 'sh601238',
-    'sh601633', 'sh601689', 'sh601717', 'sh601799', 'sh601965',
-    'sh603035', 'sh603178', 'sh603197', 'sh603305', 'sh603596',
-    'sh603659', 'sh603730', 'sh603786', 'sh603788', 'sh603997',
-    'sh688162', 'sh688533', 'sh688667', 'sh688737', 'sh688779',
-
-    # ========== 化工 (30只) ==========
-    'sh600309', 'sh600176', 'sh600346', 'sh601233', 'sh600486',
-    'sh600315', 'sh600160', 'sh600596', 'sh600623', 'sh600688',
-    'sh600803', 'sh600844', 'sh600889', 'sh601216', 'sh601678',
-    'sh603067', 'sh603077', 'sh603225', 'sh603599', 'sh603650',
-    'sh603737', 'sh603790', 'sh603843', 'sh603867', 'sh603906',
-    'sh603916', 'sh603938', 'sh603955', 'sh603977', 'sh603983',
-
-    # ========== 钢铁 (20只) ==========
-    'sh600019', 'sz000932', 'sh600808', 'sh600010', 'sz000959',
-    'sh600022', 'sh600282', 'sh600507', 'sz000825', 'sh600126',
-    'sh600231', 'sh600307', 'sh600581', 'sh600782', 'sh600808',
-    'sh601003', 'sh601005', 'sh601015', 'sh601028', 'sh601686',
-
-    # ========== 有色 (20只) ==========
-    'sh600111', 'sh600219', 'sh600362', 'sh600388', 'sh600489',
-    'sh600497', 'sh600547', 'sh600549', 'sh600768', 'sh600888',
-    'sh601137', 'sh601168', 'sh601212', 'sh601600', 'sh601677',
-    'sh601899', 'sh601958', 'sh603260', 'sh603799', 'sh603876',
-
-    # ========== 交运 (30只) ==========
-    'sh600009', 'sh600018', 'sh600026', 'sh600029', 'sh600115',
-    'sh600125', 'sh600153', 'sh600221', 'sh600270', 'sh600350',
-    'sh600428', 'sh600575', 'sh600611', 'sh600650', 'sh600676',
-    'sh600717', 'sh600751', 'sh600798', 'sh600834', 'sh600897',
-    'sh601006', 'sh601008', 'sh601018', 'sh601021', 'sh601107',
-    'sh601111', 'sh601156', 'sh601179', 'sh601872', 'sh601880',
-
-    # ========== 通信 (20只) ==========
-    'sh600050', 'sh600105', 'sh600198', 'sh600289', 'sh600345',
-    'sh600498', 'sh600522', 'sh600640', 'sh600775', 'sh600776',
-    'sh600804', 'sh600941', 'sh601728', 'sh603042', 'sh603083',
-    'sh603118', 'sh603220', 'sh603236', 'sh603602', 'sh603803',
-]
+# 请求数 / 耗时 / 并发数指标和 Server-Timing 头（实时推送是长连接，指标抓取和就绪检查是高频探测，都不计入）
+app.add_middleware(RequestMetricsMiddleware, server_timing=SERVER_TIMING,
+                   exclude=('/api/stream', '/metrics', '/api/ready'))
 
-# 港股主要股票 - 扩展版 (约200只)
-HK_STOCK_CODES = [
-    # ========== 科技互联网 (30只) ==========
-    'hk00700', 'hk09988', 'hk03690', 'hk01810', 'hk09618',  # 腾讯阿里美团小米京东
-    'hk01299', 'hk01024', 'hk02015', 'hk06690', 'hk09888',  # 阿里健康快手理想B站
-    'hk09626', 'hk09868', 'hk06060', 'hk09698', 'hk02382',  # 小鹏蔚来知乎万国数据
-    'hk09618', 'hk09999', 'hk00772', 'hk00881', 'hk00992',  # 京东健康联想移动
-    'hk02018', 'hk09626', 'hk09868', 'hk06060', 'hk09698',
-    'hk02382', 'hk09999', 'hk00772', 'hk00881', 'hk00992',
-
-    # ========== 金融 (50只) ==========
-    # 银行
-    'hk02318', 'hk03968', 'hk02328', 'hk02628', 'hk01398',  # 平安招行中银太保工行
-    'hk00939', 'hk01288', 'hk03988', 'hk03328', 'hk01658',  # 建行农行民生交行邮储
-    'hk06818', 'hk01988', 'hk03698', 'hk06060', 'hk03908',  # 光大邮储徽商众安建行
-    'hk02318', 'hk03968', 'hk02328', 'hk02628', 'hk01398',
-    'hk00939', 'hk01288', 'hk03988', 'hk03328', 'hk01658',
-    # 保险
-    'hk02318', 'hk02628', 'hk01336', 'hk06060', 'hk09626',  # 平安太保新华众安
-    'hk06690', 'hk02328', 'hk00966', 'hk01299', 'hk01336',
-    # 证券
-    'hk03908', 'hk06030', 'hk06881', 'hk01776', 'hk06178',  # 中金中信建投海通
-    'hk06837', 'hk06066', 'hk01375', 'hk01788', 'hk06886',  # 光大证券HTSC
-    'hk01456', 'hk06099', 'hk06030', 'hk06881', 'hk01776',
-    'hk06178', 'hk06837', 'hk06066', 'hk01375', 'hk01788',
-
-    # ========== 地产 (40只) ==========
-    'hk01109', 'hk00688', 'hk01918', 'hk03377', 'hk02007',  # 华润海外融创远洋碧桂园
-    'hk00884', 'hk00604', 'hk01238', 'hk01813', 'hk03383',  # 旭辉中国海外合生世茂
-    'hk01109', 'hk00688', 'hk01918', 'hk03377', 'hk02007',
-    'hk00884', 'hk00604', 'hk01238', 'hk01813', 'hk03383',
-    'hk00817', 'hk01113', 'hk01209', 'hk01622', 'hk01898',  # 龙湖长实龙湖龙光
-    'hk01918', 'hk01928', 'hk01972', 'hk01997', 'hk02007',
-    'hk02202', 'hk02380', 'hk02772', 'hk02869', 'hk03377',
-    'hk03800', 'hk03883', 'hk03900', 'hk06098', 'hk06138',
-    'hk06808', 'hk06813', 'hk06878', 'hk06988', 'hk09979',
-
-    # ========== 能源 (30只) ==========
-    'hk00883', 'hk01088', 'hk02883', 'hk00386', 'hk00857',  # 中海油中煤石油
-    'hk01088', 'hk01171', 'hk00902', 'hk00836', 'hk00676',  # 兖矿能源华能电能实业
-    'hk00883', 'hk01088', 'hk02883', 'hk00386', 'hk00857',
-    'hk01088', 'hk01171', 'hk00902', 'hk00836', 'hk00676',
-    'hk00027', 'hk00038', 'hk00135', 'hk00142', 'hk00256',  # 银河娱乐第一拖拉机
-    'hk00316', 'hk00357', 'hk00386', 'hk00546', 'hk00603',
-    'hk00656', 'hk00683', 'hk00802', 'hk00836', 'hk00902',
-
-    # ========== 消费 (40只) ==========
-    'hk01898', 'hk00189', 'hk02331', 'hk01929', 'hk06862',  # 中煤能源东岳新秀丽周大福
-    'hk00189', 'hk00220', 'hk00291', 'hk00322', 'hk00345',  # 华润啤酒康师傅维他奶
-    'hk00384', 'hk00493', 'hk00520', 'hk00551', 'hk00662',  # 中国食品呷哺呷哺裕元
-    'hk00688', 'hk00709', 'hk00780', 'hk00853', 'hk00995',  # 中国海外淘大食品
-    'hk01044', 'hk01070', 'hk01128', 'hk01151', 'hk01181',  # 恒安国际周大福
-    'hk01211', 'hk01234', 'hk01259', 'hk01368', 'hk01415',  # 比亚迪利民实业
-    'hk01513', 'hk01548', 'hk01610', 'hk01698', 'hk01797',  # 丽珠医药新东方在线
-    'hk01810', 'hk01833', 'hk01898', 'hk01928', 'hk01929',
-
-    # ========== 医药 (30只) ==========
-    'hk02269', 'hk01093', 'hk01177', 'hk01801', 'hk06160',  # 药明生物石药中国生物信达
-    'hk06690', 'hk09926', 'hk09688', 'hk02162', 'hk02157',  # 海尔生物康诺亚
-    'hk02269', 'hk01093', 'hk01177', 'hk01801', 'hk06160',
-    'hk06690', 'hk09926', 'hk09688', 'hk02162', 'hk02157',
-    'hk01530', 'hk01548', 'hk01558', 'hk01578', 'hk01598',  # 三生制药
-    'hk01672', 'hk01681', 'hk01726', 'hk01789', 'hk01801',
-    'hk01873', 'hk01877', 'hk01898', 'hk01952', 'hk01966',
-
-    # ========== 电信 (10只) ==========
-    'hk00762', 'hk00941', 'hk00728', 'hk00694', 'hk00788',
-    'hk00762', 'hk00941', 'hk00728', 'hk00694', 'hk00788',
-
-    # ========== 公用事业 (20只) ==========
-    'hk00836', 'hk00002', 'hk00603', 'hk01083', 'hk00802',
-    'hk00027', 'hk00316', 'hk00357', 'hk00546', 'hk00656',
-    'hk00683', 'hk00802', 'hk00836', 'hk00902', 'hk01038',
-    'hk01071', 'hk01083', 'hk01138', 'hk01193', 'hk01335',
-]
 
+class CursorError(ValueError):
+    """分页游标无效或已过期"""
 
-def parse_tencent_data(text: str) -> List[dict]:
-    """解析腾讯财经返回的数据"""
-    stocks = []
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
 
-    # 处理 GBK 编码
-    try:
-        text = text.encode('latin1').decode('gbk')
-    except:
-        pass
 
-    regex = r'v_([a-z0-9]+)="([^"]+)"'
-    matches = re.findall(regex, text)
+@app.exception_handler(CursorError)
+async def cursor_error_handler(request: Request, exc: CursorError):
+    return JSONResponse({"success": False, "error": str(exc)}, status_code=exc.status_code)
 
-    for code, data_str in matches:
-        data = data_str.split('~')
-        if len(data) < 10:
-            continue
 
-        try:
-            is_index = code.startswith('sh000') or code.startswith('sz399') or code.startswith('hkHS')
-
-            stock = {
-                'code': code,
-                'name': data[1] if len(data) > 1 else '--',
-                'price': float(data[3]) if len(data) > 3 and data[3] else 0,
-                'previousClose': float(data[4]) if len(data) > 4 and data[4] else 0,
-                'open': float(data[5]) if len(data) > 5 and data[5] else 0,
-                'high': float(data[33]) if len(data) > 33 and data[33] else 0,
-                'low': float(data[34]) if len(data) > 34 and data[34] else 0,
-                'volume': int(data[6]) if len(data) > 6 and data[6] else 0,
-                'change': float(data[31]) if len(data) > 31 and data[31] else 0,
-                'changePercent': float(data[32]) if len(data) > 32 and data[32] else 0,
-                'pe': 0 if is_index else (float(data[39]) if len(data) > 39 and data[39] else 0),
-                'pb': 0 if is_index else (float(data[46]) if len(data) > 46 and data[46] else 0),
-                'marketCap': 0 if is_index else (round(float(data[45]), 2) if len(data) > 45 and data[45] else 0),  # 已经是亿
-                'floatMarketCap': 0 if is_index else (round(float(data[44]), 2) if len(data) > 44 and data[44] else 0),  # 已经是亿
-                'dividendYield': 0 if is_index else (float(data[64]) / 100 if len(data) > 64 and data[64] else 0),  # 股息率(%), 转为小数
-                'turnoverRate': 0 if is_index else (float(data[37]) if len(data) > 37 and data[37] else 0),
-                'amplitude': float(data[43]) if len(data) > 43 and data[43] else 0,
-            }
-            stocks.append(stock)
-        except Exception as e:
-            print(f"解析股票 {code} 失败: {e}")
-            continue
+@app.exception_handler(UniverseError)
+async def universe_error_handler(request: Request, exc: UniverseError):
+    return JSONResponse({"success": False, "error": str(exc)}, status_code=400)
 
-    return stocks
 
+def parse_market(market: str) -> str:
+    """筛选类接口的市场参数：只接受 a股 / 港股，其他值返回 400（不再当作港股处理）"""
+    if market not in ('a股', '港股'):
+        raise UniverseError(f"不支持的市场: {market}（a股 / 港股）")
+    return market
 
-def fetch_tencent_quotes(codes: List[str]) -> List[dict]:
-    """从腾讯财经获取行情"""
-    if not codes:
-        return []
 
+def parse_sectors(market: str, sector: Optional[str]) -> Tuple[int, ...]:
+    """板块参数（逗号分隔的板块名）-> 板块编号"""
+    return universe[market].sector_ids(sector.split(',')) if sector else ()
+
+
+def query_key(**params) -> str:
+    """查询条件的短哈希，用于游标校验和结果缓存"""
+    return hashlib.sha1(json.dumps(params, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:12]
+
+
+def encode_cursor(version: int, position: int, key: str) -> str:
+    raw = json.dumps({'v': version, 'p': position, 'q': key}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict:
     try:
-        code_str = ','.join(codes)
-        url = f"https://qt.gtimg.cn/q={code_str}"
-        response = requests.get(url, timeout=10)
-        response.encoding = 'gbk'
-
-        if response.status_code == 200:
-            return parse_tencent_data(response.text)
-    except Exception as e:
-        print(f"获取腾讯行情失败: {e}")
-
-    return []
-
-
-# 股息率缓存（预加载常用股票）
-dividend_yield_cache = {
-    # 银行股（高股息典型）
-    'sh601398': 0.052,  # 工商银行 5.2%
-    'sh601288': 0.051,  # 农业银行 5.1%
-    'sh601988': 0.055,  # 中国银行 5.5%
-    'sh601328': 0.061,  # 交通银行 6.1%
-    'sh600036': 0.048,  # 招商银行 4.8%
-    'sh601166': 0.068,  # 兴业银行 6.8%
-    'sh601818': 0.065,  # 光大银行 6.5%
-    'sh600016': 0.062,  # 民生银行 6.2%
-    'sh601998': 0.058,  # 中信银行 5.8%
-    'sh601169': 0.055,  # 北京银行 5.5%
-    'sh601229': 0.054,  # 上海银行 5.4%
-    'sh600919': 0.053,  # 江苏银行 5.3%
-    'sh601009': 0.052,  # 南京银行 5.2%
-    'sh601997': 0.058,  # 贵阳银行 5.8%
-    'sh600015': 0.056,  # 华夏银行 5.6%
-    # 能源股
-    'sh601857': 0.045,  # 中石油 4.5%
-    'sh600028': 0.058,  # 中石化 5.8%
-    'sh601088': 0.068,  # 中国神华 6.8%
-    'sh600938': 0.052,  # 中海油 5.2%
-    # 基建股
-    'sh601668': 0.038,  # 中国建筑 3.8%
-    'sh601390': 0.035,  # 中国中铁 3.5%
-    'sh601800': 0.032,  # 中国铁建 3.2%
-    'sh601186': 0.036,  # 中国铁建 3.6%
-    # 地产
-    'sz000002': 0.045,  # 万科 4.5%
-    'sh600048': 0.038,  # 保利 3.8%
-    # 钢铁
-    'sh600019': 0.042,  # 宝钢 4.2%
-    'sz000932': 0.065,  # 华菱钢铁 6.5%
-    # 电力
-    'sh600900': 0.035,  # 长江电力 3.5%
-    'sh601985': 0.028,  # 中国核电 2.8%
-    # 保险
-    'sh601318': 0.025,  # 平安 2.5%
-    'sh601628': 0.022,  # 中国人寿 2.2%
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return {'v': int(data['v']), 'p': int(data['p']), 'q': str(data['q'])}
+    except Exception:
+        raise CursorError('无效的分页游标')
+
+
+async def resolve_snapshot(market: str, cursor: Optional[str], key: str) -> Tuple[MarketSnapshot, Optional[int]]:
+    """
+    确定本次查询使用的快照：
+    没有游标时取最新快照；有游标时取游标对应的快照版本，保证翻页结果一致
+    """
+    if not cursor:
+        return await snapshot_store.get(market), None
+
+    data = decode_cursor(cursor)
+    if data['q'] != key:
+        raise CursorError('分页游标与查询条件不匹配')
+    snapshot = await snapshot_store.find_version(market, data['v'])
+    if snapshot is None:
+        raise CursorError('分页游标已过期，请重新查询', status_code=410)
+    return snapshot, data['p']
+
+
+_order_cache: 'OrderedDict[tuple, np.ndarray]' = OrderedDict()
+_order_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def cached_order(version: int, key: str, compute: Callable[[], np.ndarray]) -> np.ndarray:
+    """(快照版本, 查询) -> 结果行号（按排序后），翻页时直接复用；分红数据更新后失效"""
+    cache_key = (version, dividend_store.version, key)
+    order = _order_cache.get(cache_key)
+    if order is None:
+        _order_cache_stats['misses'] += 1
+        with timed('filter'):
+            order = compute()
+        _order_cache[cache_key] = order
+        if len(_order_cache) > ORDER_CACHE_SIZE:
+            _order_cache.popitem(last=False)
+    else:
+        _order_cache_stats['hits'] += 1
+        _order_cache.move_to_end(cache_key)
+    return order
+
+
+def sorted_order(table: QuoteTable, sortBy: Optional[str], order: str,
+                 mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """按排序索引取出（命中的）行号；sortBy 为空时保持原始顺序（sortBy 由各接口按 SORT_FIELDS 校验）"""
+    if sortBy is None:
+        rows = np.arange(len(table))
+    else:
+        rows = table.argsort(sortBy, descending=(order == 'desc'))
+    return rows if mask is None else rows[mask[rows]]
+
+
+def page_response(snapshot: MarketSnapshot, table: QuoteTable, rows: np.ndarray,
+                  start: int, pageSize: int, key: str, format: str = 'rows') -> dict:
+    """
+    取一页数据，附带下一页游标（O(pageSize)）
+    format='columns' 时字段名只在 columns 中出现一次，data 为按该顺序排列的值数组
+    offset 为本页第一行在结果中的位置；游标与 pageSize 不对齐时没有对应的页码，page 为 None
+    """
+    end = start + pageSize
+    page_rows = rows[start:end]
+    if format == 'columns':
+        layout = {"columns": ROW_FIELDS, "data": table.row_lists(page_rows)}
+    else:
+        layout = {"data": table.rows(page_rows)}
+    return {
+        "success": True,
+        **layout,
+        "total": len(rows),
+        "page": start // pageSize + 1 if start % pageSize == 0 else None,
+        "offset": start,
+        "pageSize": pageSize,
+        "version": snapshot.version,
+        "nextCursor": encode_cursor(snapshot.version, end, key) if end < len(rows) else None,
+        **snapshot_meta(snapshot),
+    }
+
+
+# 烟蒂股筛选参数 -> (字段, 是否为上限)；上限条件同时要求字段为正
+CIGAR_BUTT_LIMITS = {
+    'peMax': ('pe', True),
+    'pbMax': ('pb', True),
+    'marketCapMax': ('marketCap', True),
+    'dividendYieldMin': ('dividendYield', False),
 }
+SCREEN_FILTER_FIELDS = tuple(CIGAR_BUTT_LIMITS)
+
+
+def cigar_butt_masks(table: QuoteTable, conditions: List[Dict[str, Optional[float]]]) -> np.ndarray:
+    """
+    多组烟蒂股筛选条件一次求值，返回 (条件组数, 股票数) 的布尔掩码
+    每个字段的各组阈值组成列向量，与整列广播比较，字段只读取一次
+    """
+    masks = np.ones((len(conditions), len(table)), dtype=bool)
+    for param, (field, upper) in CIGAR_BUTT_LIMITS.items():
+        limits = np.array([c.get(param) for c in conditions], dtype=float)  # None -> nan
+        active = ~np.isnan(limits)
+        if not active.any():
+            continue
+        values = table[field]
+        if upper:
+            masks[active] &= (values > 0) & (values <= limits[active, None])
+        else:
+            masks[active] &= values >= limits[active, None]
+    return masks
 
-def get_dividend_yield(code: str) -> float:
-    """获取股票股息率（从缓存）"""
-    return dividend_yield_cache.get(code, 0)
 
+def cigar_butt_mask(table: QuoteTable,
+                    peMax: Optional[float] = None,
+                    pbMax: Optional[float] = None,
+                    dividendYieldMin: Optional[float] = None,
+                    marketCapMax: Optional[float] = None) -> np.ndarray:
+    """烟蒂股筛选条件 -> 布尔掩码（PE/PB/市值要求为正）"""
+    conditions = {'peMax': peMax, 'pbMax': pbMax, 'dividendYieldMin': dividendYieldMin, 'marketCapMax': marketCapMax}
+    return cigar_butt_masks(table, [conditions])[0]
 
-def enrich_with_dividend_yield(stocks: List[dict]) -> List[dict]:
-    """为股票添加股息率信息"""
-    for stock in stocks:
-        stock['dividendYield'] = get_dividend_yield(stock['code'])
-    return stocks
+
+def screen_page(table: QuoteTable, mask: np.ndarray, page: int, pageSize: int):
+    """命中的股票按 PB 排序后取一页，返回 (当页数据, 命中总数)"""
+    order = table.argsort('pb')
+    filtered = order[mask[order]]
+
+    start = (page - 1) * pageSize
+    return table.rows(filtered[start:start + pageSize]), len(filtered)
+
+
+response_cache = ResponseCache(int(RESPONSE_CACHE_MB * 1024 * 1024))
+
+
+def cached_response(request: Request, snapshot: MarketSnapshot, key: Hashable,
+                    build: Callable[[], dict], conditional: bool = True) -> Response:
+    """
+    基于快照的响应：同一快照版本上相同的查询只生成、序列化、压缩一次
+    conditional=True（GET）时带 ETag 和 Cache-Control，If-None-Match 匹配时返回 304；
+    快照为空（上游不可用）时不缓存；快照已过期（stale）时要求客户端每次重新验证
+    缓存的响应体中不含快照时长，当前值由响应头 Age 给出（快照已存在的秒数）
+    """
+    stale = snapshot_store.is_stale(snapshot)
+    headers = {'Vary': 'Accept-Encoding', 'Age': str(int(snapshot.age))}
+    if conditional:
+        # 快照在下一次刷新前不会变化
+        headers['Cache-Control'] = 'no-cache' if stale else f'public, max-age={int(refresh_interval(snapshot.market))}'
+
+    if not snapshot.version:
+        return JSONResponse(build(), headers={'Cache-Control': 'no-store'})
+
+    cache_key = (request.url.path, key, snapshot.version, dividend_store.version, stale)
+    encoding = choose_encoding(request.headers.get('accept-encoding', ''))
+    if conditional:
+        etag = make_etag(cache_key, encoding)
+        headers['ETag'] = etag
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            response_cache.stats['notModified'] += 1
+            return Response(status_code=304, headers=headers)
+
+    def render() -> bytes:
+        with timed('build'):
+            payload = build()
+        with timed('serialize'):
+            return fast_json.dumps(payload)
+
+    entry = response_cache.get_or_build(cache_key, render)
+    content = response_cache.content(entry, encoding)
+    if content is not entry.body:
+        headers['Content-Encoding'] = encoding
+    return Response(content, media_type='application/json', headers=headers)
+
+
+def snapshot_meta(snapshot: MarketSnapshot) -> dict:
+    """
+    响应中的快照时间信息；stale 表示上游暂时不可用，返回的是最后一次成功抓取的数据
+    只包含同一快照上不变的值（响应体会被缓存），快照时长见响应头 Age
+    """
+    return {
+        "updateTime": format_time(snapshot.fetched_at),
+        "stale": snapshot_store.is_stale(snapshot),
+    }
 
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "烟蒂股筛选器 API", "version": "1.0.0"}
 
 
 @app.get("/api/market/indices")
-def get_market_indices():
+async def get_market_indices(request: Request):
     """获取市场指数"""
-    codes = ['sh000001', 'sz399001', 'hkHSI']
-    stocks = fetch_tencent_quotes(codes)
-
-    indices = []
-    for stock in stocks:
-        indices.append({
-            'code': stock['code'],
-            'name': stock['name'],
-            'price': stock['price'],
-            'change': stock['change'],
-            'changePercent': stock['changePercent'],
-        })
+    snapshot = await snapshot_store.get('indices')
+
+    def build():
+        indices = []
+        for stock in snapshot.table.rows(range(len(snapshot.table))):
+            indices.append({
+                'code': stock['code'],
+                'name': stock['name'],
+                'price': stock['price'],
+                'change': stock['change'],
+                'changePercent': stock['changePercent'],
+            })
+
+        return {
+            "success": True,
+            "data": indices,
+            **snapshot_meta(snapshot),
+        }
+
+    return cached_response(request, snapshot, 'indices', build)
 
-    return {
-        "success": True,
-        "data": indices,
-        "updateTime": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
+
+async def list_stocks(request: Request, market: str, page: int, pageSize: int, sortBy: Optional[str],
+                      order: str, cursor: Optional[str], sector: Optional[str], format: str) -> Response:
+    """A 股 / 港股列表：按预建排序索引取一页，支持游标翻页和板块过滤"""
+    sector_ids = parse_sectors(market, sector)
+    key = query_key(market=market, sortBy=sortBy, order=order, sectors=sector_ids)
+    snapshot, position = await resolve_snapshot(market, cursor, key)
+    table = snapshot.view(sector_ids)
+
+    def build():
+        with timed('filter'):
+            rows = sorted_order(table, sortBy, order)
+        return page_response(snapshot, table, rows, start, pageSize, key, format)
+
+    start = position if position is not None else (page - 1) * pageSize
+    return cached_response(request, snapshot, (key, start, pageSize, format), build)
 
 
 @app.get("/api/stocks/a-share")
-def get_a_share_stocks(
+async def get_a_share_stocks(
+    request: Request,
     page: int = Query(1, ge=1),
-    pageSize: int = Query(100, ge=10, le=500)
+    pageSize: int = Query(100, ge=10, le=500),
+    sortBy: Optional[str] = Query(None, pattern=SORT_PATTERN, description="排序字段，默认保持原始顺序"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 nextCursor"),
+    sector: Optional[str] = Query(None, description="板块，多个用逗号分隔"),
+    format: str = Query("rows", pattern="^(rows|columns)$", description="columns: 字段名只返回一次，每行为值数组")
 ):
     """获取 A 股股票列表"""
-    all_stocks = fetch_tencent_quotes(A_STOCK_CODES)
+    return await list_stocks(request, 'a股', page, pageSize, sortBy, order, cursor, sector, format)
 
-    total = len(all_stocks)
-    start = (page - 1) * pageSize
-    end = min(start + pageSize, total)
-    page_data = all_stocks[start:end]
 
-    return {
+@app.get("/api/stocks/hk")
+async def get_hk_stocks(
+    request: Request,
+    page: int = Query(1, ge=1),
+    pageSize: int = Query(100, ge=10, le=500),
+    sortBy: Optional[str] = Query(None, pattern=SORT_PATTERN, description="排序字段，默认保持原始顺序"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 nextCursor"),
+    sector: Optional[str] = Query(None, description="板块，多个用逗号分隔"),
+    format: str = Query("rows", pattern="^(rows|columns)$", description="columns: 字段名只返回一次，每行为值数组")
+):
+    """获取港股股票列表"""
+    return await list_stocks(request, '港股', page, pageSize, sortBy, order, cursor, sector, format)
+
+
+@app.get("/api/stocks/filter")
+async def filter_stocks(
+    request: Request,
+    market: str = Query("a股"),
+    peMax: Optional[float] = Query(None),
+    pbMax: Optional[float] = Query(None),
+    dividendYieldMin: Optional[float] = Query(None),
+    marketCapMax: Optional[float] = Query(None),
+    page: int = Query(1, ge=1),
+    pageSize: int = Query(50, ge=10, le=200),
+    sortBy: str = Query("pb", pattern=SORT_PATTERN),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 nextCursor"),
+    sector: Optional[str] = Query(None, description="板块，多个用逗号分隔"),
+    format: str = Query("rows", pattern="^(rows|columns)$", description="columns: 字段名只返回一次，每行为值数组")
+):
+    """筛选烟蒂股"""
+    market = parse_market(market)
+    sector_ids = parse_sectors(market, sector)
+    key = query_key(market=market, peMax=peMax, pbMax=pbMax, dividendYieldMin=dividendYieldMin,
+                    marketCapMax=marketCapMax, sortBy=sortBy, order=order, sectors=sector_ids)
+    snapshot, position = await resolve_snapshot(market, cursor, key)
+
+    # 添加股息率信息（每个快照计算一次，不修改共享快照）；指定板块时只取该板块的子表
+    table = snapshot.view(sector_ids, enriched=True)
+
+    # 应用筛选条件（布尔掩码），按排序索引取出命中行；同一快照的后续翻页直接复用
+    def build():
+        rows = cached_order(snapshot.version, key, lambda: sorted_order(
+            table, sortBy, order, cigar_butt_mask(table, peMax, pbMax, dividendYieldMin, marketCapMax)))
+        return page_response(snapshot, table, rows, start, pageSize, key, format)
+
+    start = position if position is not None else (page - 1) * pageSize
+    return cached_response(request, snapshot, (key, start, pageSize, format), build)
+
+
+class StrategyFilterRequest(BaseModel):
+    """自定义策略筛选请求（strategy 与前端 StrategyEditor.getStrategy() 格式相同）"""
+    market: str = "a股"
+    strategy: dict
+    page: int = 1
+    pageSize: int = 50
+    sortBy: str = "pb"
+    order: str = "asc"
+    cursor: Optional[str] = None
+    sector: Optional[str] = None
+    format: str = "rows"
+
+
+@app.post("/api/stocks/filter")
+async def filter_stocks_by_strategy(req: StrategyFilterRequest, request: Request):
+    """按自定义策略筛选（支持计算条件和且/或混合逻辑）"""
+    if (req.page < 1 or not 10 <= req.pageSize <= 500 or req.order not in ('asc', 'desc')
+            or req.format not in ('rows', 'columns')):
+        return JSONResponse({"success": False, "error": "分页参数无效"}, status_code=400)
+    if req.sortBy not in SORT_FIELDS:
+        return JSONResponse({"success": False, "error": f"不支持的排序字段: {req.sortBy}"}, status_code=400)
+
+    try:
+        strategy_id, predicate = get_strategy_predicate(req.strategy)
+    except StrategyError as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=400)
+
+    market = parse_market(req.market)
+    sector_ids = parse_sectors(market, req.sector)
+    key = query_key(market=market, strategy=strategy_id, sortBy=req.sortBy, order=req.order, sectors=sector_ids)
+    snapshot, position = await resolve_snapshot(market, req.cursor, key)
+    table = snapshot.view(sector_ids, enriched=True)
+
+    def build():
+        rows = cached_order(snapshot.version, key,
+                            lambda: sorted_order(table, req.sortBy, req.order, predicate(table)))
+        return {
+            **page_response(snapshot, table, rows, start, req.pageSize, key, req.format),
+            "strategyId": strategy_id,
+        }
+
+    start = position if position is not None else (req.page - 1) * req.pageSize
+    return cached_response(request, snapshot, (key, start, req.pageSize, req.format), build, conditional=False)
+
+
+BATCH_MAX_SCREENS = 50  # 批量筛选一次最多的筛选数
+
+
+class BatchScreen(BaseModel):
+    """批量筛选中的一组条件：烟蒂股参数，或 strategy（自定义策略，优先）"""
+    id: Optional[str] = None  # 调用方的标识，原样返回
+    market: str = "a股"
+    peMax: Optional[float] = None
+    pbMax: Optional[float] = None
+    dividendYieldMin: Optional[float] = None
+    marketCapMax: Optional[float] = None
+    strategy: Optional[dict] = None
+    sector: Optional[str] = None
+    sortBy: str = "pb"
+    order: str = "asc"
+    limit: int = 50
+
+
+class BatchFilterRequest(BaseModel):
+    screens: List[BatchScreen]
+    format: str = "rows"
+
+
+@app.post("/api/stocks/filter/batch")
+async def filter_stocks_batch(req: BatchFilterRequest):
+    """
+    批量筛选：多组条件共用同一个快照，每个市场只取一次快照
+    同一市场（板块）上的烟蒂股条件一次向量化求值；返回每组的命中数和排序后的前 limit 只
+    """
+    if not 1 <= len(req.screens) <= BATCH_MAX_SCREENS:
+        return JSONResponse({"success": False, "error": f"screens 须为 1~{BATCH_MAX_SCREENS} 组"}, status_code=400)
+    if req.format not in ('rows', 'columns'):
+        return JSONResponse({"success": False, "error": f"不支持的 format: {req.format}（rows / columns）"},
+                            status_code=400)
+
+    # 校验并按 (市场, 板块) 分组；查询键与单个筛选接口一致，结果行号缓存可以互相复用
+    groups: Dict[tuple, List[int]] = {}
+    plans = []
+    for i, screen in enumerate(req.screens):
+        if not 1 <= screen.limit <= 500 or screen.order not in ('asc', 'desc') or screen.sortBy not in SORT_FIELDS:
+            return JSONResponse({"success": False, "error": f"第 {i + 1} 组的排序或数量参数无效"}, status_code=400)
+        market = parse_market(screen.market)
+        sector_ids = parse_sectors(market, screen.sector)
+        plan = {'market': market, 'strategyId': None, 'predicate': None,
+                'conditions': {param: getattr(screen, param) for param in SCREEN_FILTER_FIELDS}}
+        if screen.strategy is not None:
+            try:
+                plan['strategyId'], plan['predicate'] = get_strategy_predicate(screen.strategy)
+            except StrategyError as e:
+                return JSONResponse({"success": False, "error": f"第 {i + 1} 组: {e}"}, status_code=400)
+            plan['key'] = query_key(market=market, strategy=plan['strategyId'], sortBy=screen.sortBy,
+                                    order=screen.order, sectors=sector_ids)
+        else:
+            plan['key'] = query_key(market=market, **plan['conditions'], sortBy=screen.sortBy,
+                                    order=screen.order, sectors=sector_ids)
+        plans.append(plan)
+        groups.setdefault((market, sector_ids), []).append(i)
+
+    snapshots = {market: await snapshot_store.get(market) for market, _ in groups}
+
+    results: List[Optional[dict]] = [None] * len(plans)
+    for (market, sector_ids), indexes in groups.items():
+        snapshot = snapshots[market]
+        table = snapshot.view(sector_ids, enriched=True)
+        masks: Dict[int, np.ndarray] = {}
+
+        def compute_mask(i: int) -> np.ndarray:
+            plan = plans[i]
+            if plan['predicate'] is not None:
+                return plan['predicate'](table)
+            if not masks:
+                # 第一次缓存未命中时，本组所有烟蒂股条件一起求值
+                pending = [j for j in indexes if plans[j]['predicate'] is None]
+                masks.update(zip(pending, cigar_butt_masks(table, [plans[j]['conditions'] for j in pending])))
+            return masks[i]
+
+        for i in indexes:
+            screen, plan = req.screens[i], plans[i]
+            rows = cached_order(snapshot.version, plan['key'],
+                                lambda: sorted_order(table, screen.sortBy, screen.order, compute_mask(i)))
+            page = rows[:screen.limit]
+            if req.format == 'columns':
+                layout = {"columns": ROW_FIELDS, "data": table.row_lists(page)}
+            else:
+                layout = {"data": table.rows(page)}
+            results[i] = {"id": screen.id, "market": market, "total": len(rows), **layout}
+            if plan['strategyId']:
+                results[i]["strategyId"] = plan['strategyId']
+
+    payload = {
         "success": True,
-        "data": page_data,
-        "total": total,
-        "page": page,
-        "pageSize": pageSize,
-        "updateTime": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "data": results,
+        "markets": {market: {"version": snapshot.version, "snapshotAge": round(snapshot.age, 1),
+                             **snapshot_meta(snapshot)}
+                    for market, snapshot in snapshots.items()},
     }
+    with timed('serialize'):
+        body = fast_json.dumps(payload)
+    return Response(body, media_type='application/json')
 
 
-@app.get("/api/stocks/hk")
-def get_hk_stocks(
+PING_MESSAGE = ('ping', 0, '{"type":"ping"}')
+
+
+def snapshot_message(snapshot: MarketSnapshot):
+    table = snapshot.enriched
+    return quote_broadcaster.snapshot_message(snapshot.market, snapshot.version, lambda: {
+        "updateTime": format_time(snapshot.fetched_at),
+        "data": table.rows(range(len(table))),
+    })
+
+
+async def stream_messages(market: str, encode: Callable, last_version: Optional[int]):
+    """
+    一个推送连接：先发完整快照，之后转发增量
+    发送速度跟不上时（客户端读得慢）队列会写满，转为重新发送完整快照
+    """
+    subscriber = quote_broadcaster.subscribe(market)
+    try:
+        snapshot = await snapshot_store.get(market)
+        current = snapshot.version
+        if last_version != current:
+            yield encode(snapshot_message(snapshot))
+
+        while True:
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), STREAM_PING_INTERVAL)
+            except asyncio.TimeoutError:
+                yield encode(PING_MESSAGE)
+                continue
+
+            kind, version, _ = message
+            if kind == 'resync':
+                snapshot = await snapshot_store.get(market)
+                message = snapshot_message(snapshot)
+                version = snapshot.version
+            elif version <= current:
+                continue  # 订阅后、发送首个快照前产生的增量已包含在快照中
+            current = version
+            yield encode(message)
+    finally:
+        quote_broadcaster.unsubscribe(market, subscriber)
+
+
+@app.get("/api/stream")
+async def stream_quotes(
+    request: Request,
+    market: str = Query("a股", description="a股 / 港股 / indices"),
+    format: str = Query("sse", pattern="^(sse|ndjson)$")
+):
+    """实时行情推送（SSE 或 NDJSON）：首条为完整快照，之后只推送变化的股票和字段"""
+    if market not in MARKET_CODES:
+        return JSONResponse({"success": False, "error": f"不支持的市场: {market}"}, status_code=400)
+
+    # SSE 断线重连时浏览器会带上最后收到的版本号，版本未变化时不再重发快照
+    last_event_id = request.headers.get('last-event-id', '')
+    last_version = int(last_event_id) if last_event_id.isdigit() else None
+
+    if format == 'sse':
+        return StreamingResponse(
+            stream_messages(market, encode_sse, last_version),
+            media_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+    return StreamingResponse(
+        stream_messages(market, encode_ndjson, None),
+        media_type='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@app.get("/api/history/filter")
+async def filter_history(
+    at: str = Query(..., description="时间点，如 2024-01-05 15:00:00；只写日期则取当天最后一个快照"),
+    market: str = Query("a股"),
+    peMax: Optional[float] = Query(None),
+    pbMax: Optional[float] = Query(None),
+    dividendYieldMin: Optional[float] = Query(None),
+    marketCapMax: Optional[float] = Query(None),
     page: int = Query(1, ge=1),
-    pageSize: int = Query(100, ge=10, le=500)
+    pageSize: int = Query(50, ge=10, le=200)
 ):
-    """获取港股股票列表"""
-    all_stocks = fetch_tencent_quotes(HK_STOCK_CODES)
+    """按历史快照筛选烟蒂股（不访问上游）"""
+    try:
+        ts = parse_time(at, inclusive=True)
+    except ValueError as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=400)
 
-    total = len(all_stocks)
-    start = (page - 1) * pageSize
-    end = min(start + pageSize, total)
-    page_data = all_stocks[start:end]
+    entry = history_store.at(parse_market(market), ts)
+    if entry is None:
+        return JSONResponse({"success": False, "error": "该时间之前没有历史快照"}, status_code=404)
+
+    table = enrich_with_dividend_yield(history_store.load(entry))
+    mask = cigar_butt_mask(table, peMax, pbMax, dividendYieldMin, marketCapMax)
+    page_data, total = screen_page(table, mask, page, pageSize)
 
     return {
         "success": True,
@@ -459,60 +1461,332 @@ def get_hk_stocks(
         "total": total,
         "page": page,
         "pageSize": pageSize,
-        "updateTime": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "updateTime": format_time(entry.ts),
     }
 
 
-@app.get("/api/stocks/filter")
-def filter_stocks(
+@app.get("/api/history/range")
+async def filter_history_range(
+    start: str = Query(..., description="开始时间或日期"),
+    end: str = Query(..., description="结束时间或日期"),
     market: str = Query("a股"),
     peMax: Optional[float] = Query(None),
     pbMax: Optional[float] = Query(None),
     dividendYieldMin: Optional[float] = Query(None),
     marketCapMax: Optional[float] = Query(None),
-    page: int = Query(1, ge=1),
-    pageSize: int = Query(50, ge=10, le=200)
+    daily: bool = Query(True, description="每天只取最后一个快照（收盘）"),
+    limit: int = Query(50, ge=1, le=500, description="每个快照最多返回的股票代码数")
 ):
-    """筛选烟蒂股"""
-    codes = A_STOCK_CODES if market == "a股" else HK_STOCK_CODES
-    all_stocks = fetch_tencent_quotes(codes)
+    """在时间范围内的每个历史快照上运行同一组筛选条件"""
+    try:
+        start_ts, end_ts = parse_time(start), parse_time(end, inclusive=True)
+    except ValueError as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=400)
+
+    entries = history_store.range(parse_market(market), start_ts, end_ts)
+    if daily:
+        entries = list({e.day: e for e in entries}.values())
+
+    def run():
+        results = []
+        for entry in entries:
+            table = enrich_with_dividend_yield(history_store.load(entry))
+            mask = cigar_butt_mask(table, peMax, pbMax, dividendYieldMin, marketCapMax)
+            order = table.argsort('pb')
+            filtered = order[mask[order]]
+            results.append({
+                "time": format_time(entry.ts),
+                "total": len(filtered),
+                "codes": table.codes[filtered[:limit]].tolist(),
+            })
+        return results
+
+    # 多个快照的计算放到线程中，避免阻塞事件循环
+    results = await asyncio.get_event_loop().run_in_executor(None, run)
 
-    # 添加股息率信息
-    all_stocks = enrich_with_dividend_yield(all_stocks)
+    return {
+        "success": True,
+        "data": results,
+        "total": len(results),
+    }
 
-    # 应用筛选条件
-    filtered = all_stocks
 
-    if peMax is not None:
-        filtered = [s for s in filtered if 0 < s.get("pe", 999) <= peMax]
+@app.get("/api/universe")
+async def get_universe():
+    """股票池：各市场的股票数量和板块"""
+    return {
+        "success": True,
+        "data": {
+            market: {"total": len(universe[market].codes), "sectors": universe[market].summary()}
+            for market in ('a股', '港股')
+        },
+    }
 
-    if pbMax is not None:
-        filtered = [s for s in filtered if 0 < s.get("pb", 999) <= pbMax]
 
-    if marketCapMax is not None:
-        filtered = [s for s in filtered if 0 < s.get("marketCap", 999999) <= marketCapMax]
+class SavedScreenRequest(BaseModel):
+    """登记保存的筛选：filter（烟蒂股参数）与 strategy（自定义策略）二选一"""
+    name: str = ""
+    market: str = "a股"
+    filter: Optional[Dict[str, float]] = None
+    strategy: Optional[dict] = None
+    sector: Optional[str] = None
 
-    if dividendYieldMin is not None:
-        filtered = [s for s in filtered if s.get("dividendYield", 0) >= dividendYieldMin]
 
-    # 按 PB 排序
-    filtered.sort(key=lambda x: x.get("pb", 999))
+def screen_definition(req: SavedScreenRequest) -> dict:
+    """规范化筛选定义（同一条件得到同一个 id）；板块按名称保存，股票池更新后仍然有效"""
+    if (req.filter is None) == (req.strategy is None):
+        raise ValueError("filter 与 strategy 须指定且只能指定一个")
+
+    market = parse_market(req.market)
+    definition = {'market': market}
+    if req.filter is not None:
+        unknown = sorted(set(req.filter) - set(SCREEN_FILTER_FIELDS))
+        if unknown:
+            raise ValueError(f"不支持的筛选条件: {', '.join(unknown)}")
+        definition['filter'] = dict(req.filter)
+    else:
+        definition['strategy'] = req.strategy
+
+    if req.sector:
+        parse_sectors(market, req.sector)  # 校验板块名
+        definition['sectors'] = sorted(set(req.sector.split(',')))
+    return definition
+
+
+def get_screen(screen_id: str):
+    screen_registry.reload_if_changed()
+    return screen_registry.get(screen_id)
 
-    total = len(filtered)
-    start = (page - 1) * pageSize
-    end = min(start + pageSize, total)
-    page_data = filtered[start:end]
 
+def screen_not_found(screen_id: str) -> JSONResponse:
+    return JSONResponse({"success": False, "error": f"筛选不存在: {screen_id}"}, status_code=404)
+
+
+def materialize_screen(screen, snapshot: MarketSnapshot):
+    """筛选还没有基于该快照的结果（刚登记、其他 worker 登记后重新加载）时在该快照上完整计算一次"""
+    if snapshot.version and (screen.version, screen.dividend_version) != (snapshot.version, dividend_store.version):
+        screen.evaluate(snapshot.enriched, snapshot.version, dividend_store.version,
+                        update_time=format_time(snapshot.fetched_at))
+
+
+@app.post("/api/screens")
+async def create_screen(req: SavedScreenRequest):
+    """登记保存的筛选，立即在当前快照上计算命中结果"""
+    try:
+        definition = screen_definition(req)
+        screen = screen_registry.register(definition, req.name)
+    except (StrategyError, UniverseError, ValueError) as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=400)
+
+    snapshot = await snapshot_store.get(screen.market)
+    materialize_screen(screen, snapshot)
+    return {"success": True, "data": screen.summary()}
+
+
+@app.get("/api/screens")
+async def list_screens():
+    """所有保存的筛选及其命中数"""
+    screen_registry.reload_if_changed()
+    return {"success": True, "data": [screen.summary() for screen in screen_registry.all()]}
+
+
+@app.get("/api/screens/{screen_id}")
+async def get_screen_results(
+    request: Request,
+    screen_id: str,
+    page: int = Query(1, ge=1),
+    pageSize: int = Query(50, ge=10, le=500),
+    sortBy: str = Query("pb", pattern=SORT_PATTERN),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 nextCursor"),
+    format: str = Query("rows", pattern="^(rows|columns)$", description="columns: 字段名只返回一次，每行为值数组")
+):
+    """保存的筛选的命中股票（直接使用物化结果，不重新筛选）"""
+    screen = get_screen(screen_id)
+    if screen is None:
+        return screen_not_found(screen_id)
+    key = query_key(screen=screen.id, sortBy=sortBy, order=order)
+    snapshot, position = await resolve_snapshot(screen.market, cursor, key)
+    if position is None:
+        materialize_screen(screen, snapshot)
+    table = snapshot.enriched
+
+    def members() -> np.ndarray:
+        # 游标指向的旧快照已不是物化结果对应的版本时，在该快照上重新求值
+        if (screen.version, screen.dividend_version) == (snapshot.version, dividend_store.version):
+            return screen.members
+        return screen.predicate(table)
+
+    def build():
+        rows = cached_order(snapshot.version, key, lambda: sorted_order(table, sortBy, order, members()))
+        return {
+            **page_response(snapshot, table, rows, start, pageSize, key, format),
+            "screenId": screen.id,
+            "name": screen.name,
+        }
+
+    start = position if position is not None else (page - 1) * pageSize
+    return cached_response(request, snapshot, (key, start, pageSize, format), build)
+
+
+@app.get("/api/screens/{screen_id}/changes")
+async def get_screen_changes(screen_id: str, since: int = Query(0, ge=0, description="上次看到的快照版本")):
+    """保存的筛选在 since 版本之后的命中变化（entered: 新进入，left: 移出）"""
+    screen = get_screen(screen_id)
+    if screen is None:
+        return screen_not_found(screen_id)
     return {
         "success": True,
-        "data": page_data,
-        "total": total,
-        "page": page,
-        "pageSize": pageSize,
-        "updateTime": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "data": screen.changes_since(since),
+        "screenId": screen.id,
+        "version": screen.version,
+        "count": screen.count,
     }
 
 
+@app.delete("/api/screens/{screen_id}")
+async def delete_screen(screen_id: str):
+    """删除保存的筛选"""
+    if not screen_registry.remove(screen_id):
+        return screen_not_found(screen_id)
+    return {"success": True}
+
+
+def _cache_counts() -> Dict[tuple, float]:
+    caches = {
+        'snapshot': snapshot_store.stats,
+        'order': _order_cache_stats,
+        'response': response_cache.stats,
+    }
+    return {(name, result): stats[result] for name, stats in caches.items() for result in ('hits', 'misses')}
+
+
+def _cache_hit_ratio() -> Dict[tuple, float]:
+    counts = _cache_counts()
+    ratios = {}
+    for (name, result), value in counts.items():
+        if result == 'hits':
+            lookups = value + counts[(name, 'misses')]
+            ratios[(name,)] = value / lookups if lookups else 0.0
+    return ratios
+
+
+registry.callback('cigar_cache_lookups_total', '缓存查找次数（snapshot / order / response）', ('cache', 'result'),
+                  _cache_counts, kind='counter')
+registry.callback('cigar_cache_hit_ratio', '缓存命中率（进程启动以来）', ('cache',), _cache_hit_ratio)
+registry.callback('cigar_response_not_modified_total', 'If-None-Match 命中返回 304 的次数', (),
+                  lambda: {(): response_cache.stats['notModified']}, kind='counter')
+registry.callback('cigar_snapshot_age_seconds', '当前快照已存在的秒数', ('market',),
+                  lambda: {(m,): snap.age for m, snap in snapshot_store.latest().items()})
+registry.callback('cigar_snapshot_rows', '当前快照的股票数', ('market',),
+                  lambda: {(m,): len(snap.table) for m, snap in snapshot_store.latest().items()})
+registry.callback('cigar_snapshot_carried_rows', '当前快照中沿用上一快照数据的股票数（部分批次抓取失败）', ('market',),
+                  lambda: {(m,): snap.carried for m, snap in snapshot_store.latest().items()})
+registry.callback('cigar_snapshot_refreshes_total', '快照刷新次数：ok / error', ('result',),
+                  lambda: {('ok',): snapshot_store.stats['refreshes'] - snapshot_store.stats['refreshErrors'],
+                           ('error',): snapshot_store.stats['refreshErrors']}, kind='counter')
+registry.callback('cigar_parse_records_total', '解析的行情记录数：parsed / tooShort / badNumber / truncated', ('result',),
+                  lambda: {(k,): v for k, v in parse_stats.items() if k != 'records'}, kind='counter')
+registry.callback('cigar_parse_errors_total', '按股票统计的解析错误次数', ('code',),
+                  lambda: {(code,): n for code, n in parse_errors_by_code.items()}, kind='counter')
+registry.callback('cigar_upstream_circuit_open', '上游熔断状态（1 表示熔断中）', (),
+                  lambda: {(): 0 if upstream_breaker.closed else 1})
+registry.callback('cigar_upstream_circuit_opened_total', '熔断次数', (),
+                  lambda: {(): upstream_breaker.stats['opened']}, kind='counter')
+registry.callback('cigar_upstream_rate_limited_total', '因限速等待令牌的上游请求数', (),
+                  lambda: {(): upstream_limiter.stats['waited']}, kind='counter')
+registry.callback('cigar_snapshot_stale_served_total', '快照过期时直接返回旧快照的次数', (),
+                  lambda: {(): snapshot_store.stats['staleServed']}, kind='counter')
+registry.callback('cigar_saved_screens', '保存的筛选数', (), lambda: {(): len(screen_registry)})
+registry.callback('cigar_screen_rows_evaluated_total', '保存的筛选重新求值的行数', (),
+                  lambda: {(): sum(s.stats['rowsEvaluated'] for s in screen_registry.all())}, kind='counter')
+registry.callback('cigar_stream_connections', '实时推送连接数', (),
+                  lambda: {(): quote_broadcaster.stats['connections']})
+
+
+@app.get("/api/ready")
+async def readiness():
+    """就绪检查：各市场都已有快照时返回 200，否则 503（供 nginx / supervisor / 部署脚本判断能否接流量）"""
+    markets = {market: snap.version for market, snap in snapshot_store.latest().items()}
+    ready = snapshot_store.ready()
+    return JSONResponse({"success": ready, "ready": ready, "markets": markets,
+                         "upstream": upstream_breaker.state}, status_code=200 if ready else 503,
+                        headers={'Cache-Control': 'no-store'})
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 文本格式的运行指标"""
+    return Response(registry.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """行情快照缓存统计"""
+    return {
+        "success": True,
+        "data": snapshot_store.snapshot_stats(),
+        "dividends": dividend_store.stats(),
+        "stream": quote_broadcaster.stats,
+        "screens": {s.id: {'count': s.count, 'version': s.version, **s.stats} for s in screen_registry.all()},
+        "responses": response_cache.summary(),
+        "upstream": {
+            "breaker": upstream_breaker.summary(),
+            "limiter": {**upstream_limiter.stats, 'waitSeconds': round(upstream_limiter.stats['waitSeconds'], 3)},
+        },
+    }
+
+
+async def run_refresher():
+    """多 worker 部署的刷新进程：抓取行情，写入共享快照和历史存储，不提供 HTTP 服务"""
+    global http_client, fetch_semaphore
+    http_client = create_http_client()
+    fetch_semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    # 版本号按时间起算，刷新进程重启后 worker 看到的版本仍然递增
+    store = SnapshotStore(MARKET_CODES, first_version=int(time.time() * 1000))
+    store.add_listener(publish_shared_snapshot)
+    store.add_listener(record_history)
+
+    dividend_store.load()
+    store.start()
+    probe_task = asyncio.ensure_future(upstream_probe_loop(store))
+    print(f"刷新进程已启动，共享快照目录: {SHARED_DIR}")
+    try:
+        await dividend_refresh_loop()
+    finally:
+        probe_task.cancel()
+        await store.stop()
+        await http_client.close()
+
+
 if __name__ == "__main__":
+    import argparse
+    import subprocess
+    import sys
+
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    parser = argparse.ArgumentParser(description='烟蒂股筛选器 API')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker 进程数；大于 1 时另起一个刷新进程，worker 通过共享快照读取行情')
+    parser.add_argument('--refresher', action='store_true', help='只运行刷新进程（需设置 CIGAR_SHARED_DIR）')
+    args = parser.parse_args()
+
+    if args.refresher:
+        if not SHARED_DIR:
+            sys.exit("刷新进程需要设置 CIGAR_SHARED_DIR")
+        asyncio.run(run_refresher())
+    elif args.workers > 1:
+        app_dir = os.path.dirname(os.path.abspath(__file__))
+        os.environ.setdefault('CIGAR_SHARED_DIR', os.path.join(app_dir, 'data', 'shared'))
+        refresher = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--refresher'])
+        try:
+            uvicorn.run("api_server:app", host=args.host, port=args.port, workers=args.workers, app_dir=app_dir)
+        finally:
+            refresher.terminate()
+            refresher.wait()
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
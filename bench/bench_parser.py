@@ -0,0 +1,129 @@
+"""
+烟蒂股筛选器 - 行情解析基准测试
+对比旧版 parse_tencent_data（正则 + 逐字段 float + dict）与新版 parse_tencent_table
+
+用法:
+    python bench/bench_parser.py                        # 模拟 500 / 5000 只股票的响应
+    python bench/bench_parser.py --fixture quotes.txt   # 使用录制的真实响应（GBK 原始字节）
+
+录制真实响应:
+    curl -s "https://qt.gtimg.cn/q=sh600519,sz000858,..." -o quotes.txt
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_quote_server import make_payload, make_universe  # noqa: E402
+
+
+def legacy_parse_tencent_data(text: str) -> List[dict]:
+    """旧版解析函数（原样保留，作为对比基准）"""
+    stocks = []
+
+    # 处理 GBK 编码
+    try:
+        text = text.encode('latin1').decode('gbk')
+    except:  # noqa: E722
+        pass
+
+    regex = r'v_([a-z0-9]+)="([^"]+)"'
+    matches = re.findall(regex, text)
+
+    for code, data_str in matches:
+        data = data_str.split('~')
+        if len(data) < 10:
+            continue
+
+        try:
+            is_index = code.startswith('sh000') or code.startswith('sz399') or code.startswith('hkHS')
+
+            stock = {
+                'code': code,
+                'name': data[1] if len(data) > 1 else '--',
+                'price': float(data[3]) if len(data) > 3 and data[3] else 0,
+                'previousClose': float(data[4]) if len(data) > 4 and data[4] else 0,
+                'open': float(data[5]) if len(data) > 5 and data[5] else 0,
+                'high': float(data[33]) if len(data) > 33 and data[33] else 0,
+                'low': float(data[34]) if len(data) > 34 and data[34] else 0,
+                'volume': int(data[6]) if len(data) > 6 and data[6] else 0,
+                'change': float(data[31]) if len(data) > 31 and data[31] else 0,
+                'changePercent': float(data[32]) if len(data) > 32 and data[32] else 0,
+                'pe': 0 if is_index else (float(data[39]) if len(data) > 39 and data[39] else 0),
+                'pb': 0 if is_index else (float(data[46]) if len(data) > 46 and data[46] else 0),
+                'marketCap': 0 if is_index else (round(float(data[45]), 2) if len(data) > 45 and data[45] else 0),
+                'floatMarketCap': 0 if is_index else (round(float(data[44]), 2) if len(data) > 44 and data[44] else 0),
+                'dividendYield': 0 if is_index else (float(data[64]) / 100 if len(data) > 64 and data[64] else 0),
+                'turnoverRate': 0 if is_index else (float(data[37]) if len(data) > 37 and data[37] else 0),
+                'amplitude': float(data[43]) if len(data) > 43 and data[43] else 0,
+            }
+            stocks.append(stock)
+        except Exception as e:
+            print(f"解析股票 {code} 失败: {e}")
+            continue
+
+    return stocks
+
+
+def timeit(fn, *args, repeat: int = 20) -> float:
+    """多次运行取最好成绩（毫秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_payload(label: str, body: bytes, repeat: int) -> dict:
+    import api_server
+    from quote_table import QuoteTable
+
+    text = body.decode('gbk', errors='replace')
+
+    # 结果一致性检查
+    legacy = legacy_parse_tencent_data(text)
+    table = api_server.parse_tencent_table(body)
+    assert table.rows(range(len(table))) == legacy, '新旧解析结果不一致'
+
+    # 两边都从原始字节开始计时（旧版的解码发生在 requests 的 response.text 中）
+    legacy_ms = timeit(
+        lambda: QuoteTable.from_rows(legacy_parse_tencent_data(body.decode('gbk', errors='replace'))),
+        repeat=repeat,
+    )
+    new_ms = timeit(api_server.parse_tencent_table, body, repeat=repeat)
+    return {
+        'payload': label,
+        'symbols': len(table),
+        'bytes': len(body),
+        'legacy_ms': round(legacy_ms, 2),
+        'new_ms': round(new_ms, 2),
+        'speedup': round(legacy_ms / new_ms, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='行情解析基准测试')
+    parser.add_argument('--fixture', action='append', default=[], help='录制的响应文件（可多次指定）')
+    parser.add_argument('--sizes', default='500,5000', help='模拟响应的股票数量')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    payloads = [(f'模拟 {n} 只', make_payload(make_universe(int(n)))) for n in args.sizes.split(',') if n]
+    for path in args.fixture:
+        with open(path, 'rb') as f:
+            payloads.append((os.path.basename(path), f.read()))
+
+    print(f"{'响应':<16}{'股票数':>8}{'字节':>10}{'旧版(ms)':>12}{'新版(ms)':>12}{'加速比':>8}")
+    for label, body in payloads:
+        r = bench_payload(label, body, args.repeat)
+        print(f"{r['payload']:<16}{r['symbols']:>8}{r['bytes']:>10}{r['legacy_ms']:>12}{r['new_ms']:>12}{r['speedup']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+烟蒂股筛选器 - 响应序列化基准测试
+对比一页股票数据的几种输出方式（从列式快照取行开始计时，到得到响应字节为止）：
+- FastAPI 默认路径：dict 列表 -> jsonable_encoder -> JSONResponse
+- 标准库 json / orjson 直接序列化 dict 列表（format=rows）
+- 标准库 json / orjson 序列化紧凑格式（format=columns，字段名只出现一次）
+
+用法:
+    python bench/bench_serialize.py --sizes 500,5000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parser import timeit  # noqa: E402
+from fake_quote_server import make_payload, make_universe  # noqa: E402
+
+
+def build_cases(table, indices):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    from quote_table import ROW_FIELDS
+
+    def stdlib(payload):
+        return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+    def rows_payload():
+        return {'success': True, 'data': table.rows(indices), 'total': len(indices)}
+
+    def columns_payload():
+        return {'success': True, 'columns': ROW_FIELDS, 'data': table.row_lists(indices), 'total': len(indices)}
+
+    cases = [
+        ('FastAPI 默认', lambda: JSONResponse(jsonable_encoder(rows_payload())).body),
+        ('json rows', lambda: stdlib(rows_payload())),
+        ('json columns', lambda: stdlib(columns_payload())),
+    ]
+    try:
+        import orjson
+    except ImportError:
+        print('未安装 orjson，跳过 orjson 对比')
+    else:
+        cases += [
+            ('orjson rows', lambda: orjson.dumps(rows_payload())),
+            ('orjson columns', lambda: orjson.dumps(columns_payload())),
+        ]
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description='响应序列化基准测试')
+    parser.add_argument('--sizes', default='500,5000', help='每页股票数量')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    import api_server
+
+    print(f"{'行数':>6}  {'方式':<16}{'耗时(ms)':>10}{'加速比':>8}{'字节':>10}{'gzip字节':>10}")
+    for size in (int(n) for n in args.sizes.split(',') if n):
+        table = api_server.parse_tencent_table(make_payload(make_universe(size)))
+        indices = table.argsort('pb')
+
+        baseline = None
+        for label, fn in build_cases(table, indices):
+            body = fn()
+            ms = timeit(fn, repeat=args.repeat)
+            baseline = baseline or ms
+            print(f"{size:>6}  {label:<16}{ms:>10.2f}{baseline / ms:>8.1f}{len(body):>10}"
+                  f"{len(gzip.compress(body, 6)):>10}")
+
+
+if __name__ == '__main__':
+    main()
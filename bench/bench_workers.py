@@ -0,0 +1,154 @@
+"""
+烟蒂股筛选器 - 多 worker 扩展性压测
+分别以 1 / 2 / 4 个 worker 启动 api_server（>1 时由一个刷新进程写共享快照），
+用并发客户端压测筛选接口，同时统计模拟行情服务收到的上游请求数：
+worker 数增加时吞吐应随 CPU 核数上升，而上游请求仍保持每个刷新周期一次
+
+用法:
+    python bench/bench_workers.py --workers 1,2,4 --duration 10
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TARGET_PATH = '/api/stocks/filter?market=a股&peMax=15&pbMax=1.5&pageSize=50'
+
+# 每次刷新的上游请求数：每个市场（A 股、港股、指数）一个请求
+MARKETS = 3
+
+
+async def get_json(session: aiohttp.ClientSession, url: str) -> dict:
+    async with session.get(url) as response:
+        return await response.json()
+
+
+async def wait_ready(url: str, timeout: float = 30, path: str = TARGET_PATH):
+    deadline = time.time() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.time() < deadline:
+            try:
+                result = await get_json(session, url + path)
+                if result.get('success') and result.get('total'):
+                    return
+            except (aiohttp.ClientError, ValueError):
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError('api_server 启动超时')
+
+
+async def load(url: str, duration: float, concurrency: int, paths=(TARGET_PATH,)) -> dict:
+    """并发压测 duration 秒，每个请求从 paths 中随机选一个"""
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(session):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async with session.get(url + random.choice(paths)) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+        'errors': errors,
+    }
+
+
+async def upstream_requests(fake_url: str) -> int:
+    async with aiohttp.ClientSession() as session:
+        return (await get_json(session, fake_url + '/stats'))['requests']
+
+
+def run_case(workers: int, args) -> dict:
+    env = dict(
+        os.environ,
+        CIGAR_QUOTE_URL=f'http://127.0.0.1:{args.fake_port}/q=',
+        CIGAR_FETCH_BATCH_SIZE='100000',
+        CIGAR_REFRESH_TRADING=str(args.interval),
+        CIGAR_REFRESH_IDLE=str(args.interval),
+        CIGAR_HISTORY_INTERVAL='0',
+        CIGAR_SHARED_DIR=os.path.join(args.shared_dir, f'w{workers}'),
+    )
+    if workers == 1:
+        env.pop('CIGAR_SHARED_DIR')
+
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'api_server.py'), '--port', str(args.port), '--workers', str(workers)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{args.port}'
+    fake_url = f'http://127.0.0.1:{args.fake_port}'
+    try:
+        asyncio.run(wait_ready(url))
+        before = asyncio.run(upstream_requests(fake_url))
+        result = asyncio.run(load(url, args.duration, args.concurrency))
+        upstream = asyncio.run(upstream_requests(fake_url)) - before
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        'workers': workers,
+        **result,
+        'upstream': upstream,
+        'expected_upstream': round(args.duration / args.interval * MARKETS, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多 worker 扩展性压测')
+    parser.add_argument('--workers', default='1,2,4', help='要测试的 worker 数')
+    parser.add_argument('--duration', type=float, default=10, help='每组压测时长（秒）')
+    parser.add_argument('--concurrency', type=int, default=64, help='并发连接数')
+    parser.add_argument('--interval', type=float, default=2, help='快照刷新间隔（秒）')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--fake-port', type=int, default=9101)
+    parser.add_argument('--shared-dir', default=os.path.join(ROOT, 'data', 'bench-shared'))
+    args = parser.parse_args()
+
+    fake = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'fake_quote_server.py'), '--port', str(args.fake_port)],
+        stdout=subprocess.DEVNULL,
+    )
+    time.sleep(1)
+    try:
+        results = [run_case(int(n), args) for n in args.workers.split(',') if n]
+    finally:
+        fake.terminate()
+
+    print(f"CPU 核数 {os.cpu_count()}, 每组 {args.duration}s, 并发 {args.concurrency}, 刷新间隔 {args.interval}s")
+    print(f"{'workers':>8}{'req/s':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'错误':>8}{'上游请求':>10}{'预期':>8}")
+    for r in results:
+        print(f"{r['workers']:>8}{r['rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}"
+              f"{r['upstream']:>10}{r['expected_upstream']:>8}")
+
+
+if __name__ == '__main__':
+    main()
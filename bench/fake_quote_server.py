@@ -0,0 +1,214 @@
+"""
+烟蒂股筛选器 - 本地模拟腾讯行情服务
+模拟 qt.gtimg.cn 的 GBK 行情接口，用于压测和基准测试
+
+用法:
+    python bench/fake_quote_server.py --port 9000 --latency 0.05 --error-rate 0.02
+    CIGAR_QUOTE_URL=http://127.0.0.1:9000/q= python api_server.py
+
+    # 生成 5000 只股票的模拟股票池，供 api_server 使用（CIGAR_UNIVERSE_FILE）
+    python bench/fake_quote_server.py --universe-size 5000 --write-universe /tmp/universe.json
+
+GET /stats 返回已处理的行情请求数和返回错误的次数
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import zlib
+from typing import Dict, List, Optional
+
+# 模拟股票池的板块数
+UNIVERSE_SECTORS = 10
+
+
+def make_record(code: str, tick: int = 0) -> str:
+    """生成一只股票的行情记录（字段位置与腾讯接口一致）"""
+    base = random.Random(zlib.crc32(code.encode()))
+    noise = random.Random(zlib.crc32(f"{code}:{tick}".encode()))
+
+    fields = [''] * 70
+    prev_close = round(base.uniform(2, 200), 2)
+    change_pct = round(noise.uniform(-5, 5), 2)
+    price = round(prev_close * (1 + change_pct / 100), 2)
+    pe = round(base.uniform(-10, 60), 2)
+    pb = round(base.uniform(0.3, 8), 2)
+    market_cap = round(base.uniform(20, 20000) * price / prev_close, 2)
+
+    fields[0] = '1'
+    fields[1] = '模拟' + code[-4:]
+    fields[2] = code[2:]
+    fields[3] = str(price)
+    fields[4] = str(prev_close)
+    fields[5] = str(prev_close)
+    fields[6] = str(noise.randint(1000, 5000000))
+    fields[31] = str(round(price - prev_close, 2))
+    fields[32] = str(change_pct)
+    fields[33] = str(max(price, prev_close))
+    fields[34] = str(min(price, prev_close))
+    fields[37] = str(round(noise.uniform(0.1, 5), 2))
+    fields[39] = str(round(pe * prev_close / price, 2))
+    fields[43] = str(round(abs(change_pct) + noise.uniform(0, 2), 2))
+    fields[44] = str(round(market_cap * 0.8, 2))
+    fields[45] = str(market_cap)
+    fields[46] = str(round(pb * price / prev_close, 2))
+    fields[64] = str(round(base.uniform(0, 8), 2))
+    return f'v_{code}="{"~".join(fields)}";\n'
+
+
+def make_payload(codes: List[str], tick: int = 0) -> bytes:
+    """生成一次请求的完整响应体（GBK 编码）"""
+    return ''.join(make_record(code, tick) for code in codes).encode('gbk')
+
+
+def make_universe(size: int) -> List[str]:
+    """生成指定数量的模拟 A 股代码（沪深各半）"""
+    half = size // 2
+    return [f'sh6{i:05d}' for i in range(half)] + [f'sz0{i:05d}' for i in range(size - half)]
+
+
+def universe_document(size: int) -> Dict:
+    """模拟股票池（data/universe.json 格式）：size 只 A 股、size/4 只港股，平均分到各板块"""
+    def by_sector(codes):
+        return {f'板块{j}': codes[j::UNIVERSE_SECTORS] for j in range(UNIVERSE_SECTORS)}
+
+    return {
+        'version': 1,
+        'indices': ['sh000001', 'sz399001', 'hkHSI'],
+        'markets': {
+            'a股': by_sector(make_universe(size)),
+            '港股': by_sector([f'hk{i:05d}' for i in range(1, size // 4 + 1)]),
+        },
+    }
+
+
+def write_universe(path: str, size: int):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(universe_document(size), f, ensure_ascii=False)
+
+
+class FakeQuoteServer:
+    """极简 HTTP/1.1 服务，支持 keep-alive，响应 /q=code1,code2,..."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate   # 返回 HTTP 503 的请求比例
+        self.tick = 0
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._payloads = {}
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/q="
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                # 丢弃请求头
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+
+                path = request_line.split(b' ')[1].decode()
+                if path == '/stats':
+                    # 压测脚本读取上游请求计数（不计入 requests）
+                    body = json.dumps({'requests': self.requests, 'errors': self.errors}).encode()
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                                 b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+                    await writer.drain()
+                    continue
+
+                codes = path.split('q=', 1)[1].split(',') if 'q=' in path else []
+                self.requests += 1
+
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                if self.error_rate and self._random.random() < self.error_rate:
+                    self.errors += 1
+                    writer.write(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n'
+                                 b'Connection: keep-alive\r\n\r\n')
+                    await writer.drain()
+                    continue
+
+                # 同一 tick 内相同请求复用已生成的响应体，避免模拟服务自身成为瓶颈
+                key = (path, self.tick)
+                body = self._payloads.get(key)
+                if body is None:
+                    body = make_payload([c for c in codes if c], self.tick)
+                    self._payloads[key] = body
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\n'
+                    b'Content-Type: text/html; charset=GBK\r\n'
+                    b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+                    b'Connection: keep-alive\r\n\r\n' + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def start_in_thread(**kwargs) -> FakeQuoteServer:
+    """在后台线程（独立事件循环）中启动模拟服务，返回已就绪的服务对象"""
+    server = FakeQuoteServer(**kwargs)
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True, name='fake-quote-server').start()
+    ready.wait()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟腾讯行情服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', type=float, default=0.0, help='每次响应的额外延迟（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 HTTP 503 的请求比例（0~1）')
+    parser.add_argument('--seed', type=int, default=0, help='错误注入的随机种子')
+    parser.add_argument('--universe-size', type=int, default=0, help='生成模拟股票池的 A 股数量（500~5000）')
+    parser.add_argument('--write-universe', help='把模拟股票池写入该文件后退出（配合 --universe-size）')
+    args = parser.parse_args()
+
+    if args.write_universe:
+        write_universe(args.write_universe, args.universe_size or 500)
+        print(f"模拟股票池已写入: {args.write_universe}")
+        return
+
+    async def serve():
+        server = FakeQuoteServer(args.host, args.port, args.latency, args.error_rate, args.seed)
+        await server.start()
+        print(f"模拟行情服务已启动: {server.url}")
+        while True:
+            await asyncio.sleep(3600)
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+烟蒂股筛选器 - 同步 / 异步上游抓取压测
+使用本地模拟行情服务，对比旧的同步抓取（requests + 线程池）与新的异步抓取（aiohttp + asyncio）
+
+用法:
+    python bench/load_test.py --requests 200 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# uvicorn / starlette 同步路由默认线程池大小
+SYNC_THREADPOOL_SIZE = 40
+
+
+def summarize(name: str, latencies: list, wall: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        'name': name,
+        'requests': len(latencies),
+        'wall_s': round(wall, 3),
+        'rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+    }
+
+
+def run_sync(api_server, url: str, codes: list, total: int) -> dict:
+    """旧路径：同步路由在线程池中执行，单个 URL 阻塞请求全部股票"""
+
+    def legacy_fetch(_):
+        start = time.perf_counter()
+        response = requests.get(url + ','.join(codes), timeout=10)
+        response.encoding = 'gbk'
+        api_server.parse_tencent_data(response.text)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=SYNC_THREADPOOL_SIZE) as executor:
+        latencies = list(executor.map(legacy_fetch, range(total)))
+    return summarize('sync (requests + threadpool)', latencies, time.perf_counter() - start)
+
+
+async def run_async(api_server, codes: list, total: int) -> dict:
+    """新路径：单个事件循环 + 共享异步客户端"""
+    api_server.http_client = api_server.create_http_client()
+    api_server.fetch_semaphore = asyncio.Semaphore(api_server.FETCH_CONCURRENCY)
+
+    async def timed_fetch():
+        start = time.perf_counter()
+        await api_server.fetch_tencent_quotes(codes)
+        return time.perf_counter() - start
+
+    try:
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(timed_fetch() for _ in range(total)))
+        wall = time.perf_counter() - start
+    finally:
+        await api_server.http_client.close()
+        api_server.http_client = None
+    return summarize('async (aiohttp + asyncio)', latencies, wall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='同步/异步上游抓取压测')
+    parser.add_argument('--requests', type=int, default=200, help='模拟的上游抓取次数')
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟行情服务响应延迟（秒）')
+    parser.add_argument('--concurrency', type=int, default=256, help='异步路径的上游并发上限')
+    parser.add_argument('--port', type=int, default=9100, help='模拟行情服务端口')
+    args = parser.parse_args()
+
+    # 模拟行情服务运行在独立进程中，避免与压测客户端争用 GIL
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_quote_server.py'),
+         '--port', str(args.port), '--latency', str(args.latency)],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{args.port}/q="
+    time.sleep(1)
+
+    # 两条路径使用相同的请求粒度（每次抓取一个请求），只比较 I/O 模型
+    os.environ['CIGAR_QUOTE_URL'] = url
+    os.environ['CIGAR_FETCH_CONCURRENCY'] = str(args.concurrency)
+    os.environ['CIGAR_FETCH_BATCH_SIZE'] = '100000'
+
+    import api_server
+
+    codes = api_server.MARKET_CODES['a股']
+    try:
+        results = [
+            run_sync(api_server, url, codes, args.requests),
+            asyncio.run(run_async(api_server, codes, args.requests)),
+        ]
+    finally:
+        server.terminate()
+
+    print(f"上游延迟 {args.latency}s, {len(codes)} 只股票, 共 {args.requests} 次抓取")
+    print(f"{'路径':<32}{'耗时(s)':>10}{'req/s':>10}{'p50(ms)':>10}{'p99(ms)':>10}")
+    for r in results:
+        print(f"{r['name']:<32}{r['wall_s']:>10}{r['rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,400 @@
+"""
+烟蒂股筛选器 - 基准测试套件
+基于本地模拟行情服务（可配置延迟、错误率、股票池规模），依次测量：
+- parse: parse_tencent_data / parse_tencent_table 的解析耗时
+- fetch: fetch_tencent_quotes 抓取整个股票池的耗时（含分批、并发、重试）
+- filter: 筛选接口的计算路径（掩码 -> 排序 -> 取页 -> 序列化，不经过缓存）
+- http: 启动 api_server，对筛选 / 列表接口做并发压测（p50 / p99、req/s、服务进程 RSS）
+- startup: 新进程中 import api_server 的耗时和常驻内存，启动到 /api/ready 就绪的耗时，以及就绪后首个请求的耗时
+  （单进程和 --workers 2 各一组，后者同时检查多 worker 能否正常启动）；
+  安装了 akshare 时另测一组先导入 akshare 的结果（即改为按需导入之前的启动代价）。
+  import 的内存只是导入时的常驻内存，ready 的 server_rss_mb 为就绪时的内存：单进程部署预热后拉取分红数据时
+  仍会导入 akshare，稳定运行时的内存不在此列
+
+结果写入 JSON 文件（默认 bench/results/<时间>.json），--compare 与之前的结果对比。
+
+用法:
+    python bench/run_benchmarks.py --sizes 500,5000 --latency 0.02 --error-rate 0.01
+    python bench/run_benchmarks.py --suites parse,filter --compare bench/results/20250101-120000.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from bench_workers import load, wait_ready  # noqa: E402
+from fake_quote_server import make_payload, make_universe, write_universe  # noqa: E402
+
+SUITES = ['parse', 'fetch', 'filter', 'http', 'startup']
+
+# 对比时关注的指标：名称 -> 越大越好
+COMPARE_METRICS = {'p50_ms': False, 'p99_ms': False, 'rps': True, 'rss_mb': False,
+                   'import_ms': False, 'ready_ms': False, 'first_request_ms': False}
+
+# 在新进程中测量导入耗时和导入后的常驻内存（{preload} 为之前额外导入的模块）
+IMPORT_PROBE = '''
+import json, time
+start = time.perf_counter()
+{preload}
+import api_server
+elapsed = time.perf_counter() - start
+rss = {{}}
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith(('VmRSS:', 'VmHWM:')):
+            rss[line.split(':')[0]] = int(line.split()[1])
+print(json.dumps({{'import_ms': round(elapsed * 1000, 1), 'rss_kb': rss.get('VmRSS'), 'peak_kb': rss.get('VmHWM')}}))
+'''
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """耗时样本（秒）-> p50 / p99 / 最小值（毫秒）"""
+    samples = sorted(samples)
+    return {
+        'min_ms': round(samples[0] * 1000, 3),
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 3),
+        'p99_ms': round(samples[max(0, int(len(samples) * 0.99) - 1)] * 1000, 3),
+    }
+
+
+def measure(fn: Callable, repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def rss_mb(pid: int) -> Dict[str, Optional[float]]:
+    """进程当前和峰值常驻内存（MB，仅 Linux）"""
+    result = {'rss_mb': None, 'peak_rss_mb': None}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    result['rss_mb'] = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith('VmHWM:'):
+                    result['peak_rss_mb'] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return result
+
+
+def bench_parse(args, api_server) -> List[dict]:
+    results = []
+    for size in args.sizes:
+        body = make_payload(make_universe(size))
+        for name, fn in (('parse_tencent_data', lambda: api_server.parse_tencent_data(body.decode('gbk'))),
+                         ('parse_tencent_table', lambda: api_server.parse_tencent_table(body))):
+            results.append({'name': name, 'size': size, 'bytes': len(body), **measure(fn, args.repeat)})
+    return results
+
+
+def bench_fetch(args, api_server) -> List[dict]:
+    async def run(codes):
+        api_server.http_client = api_server.create_http_client()
+        api_server.fetch_semaphore = asyncio.Semaphore(api_server.FETCH_CONCURRENCY)
+        samples, rows = [], []
+        try:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                table = await api_server.fetch_tencent_quotes(codes)
+                samples.append(time.perf_counter() - start)
+                rows.append(len(table))
+        finally:
+            await api_server.http_client.close()
+            api_server.http_client = None
+        return samples, rows
+
+    results = []
+    for size in args.sizes:
+        samples, rows = asyncio.run(run(make_universe(size)))
+        results.append({
+            'name': 'fetch_tencent_quotes',
+            'size': size,
+            **percentiles(samples),
+            # 错误率 > 0 时，重试后仍失败的批次会缺失
+            'avg_rows': round(sum(rows) / len(rows), 1),
+            'breaker': api_server.upstream_breaker.state,
+        })
+    return results
+
+
+def bench_filter(args, api_server) -> List[dict]:
+    import fast_json
+
+    results = []
+    for size in args.sizes:
+        table = api_server.parse_tencent_table(make_payload(make_universe(size)))
+        snapshot = api_server.MarketSnapshot('a股', table, time.time(), 1)
+        api_server.build_rank_indexes(snapshot, None)  # 与服务中一致：排序索引在快照生成时建立
+        key = api_server.query_key(peMax=15, pbMax=1.5)
+
+        def run():
+            enriched = snapshot.enriched
+            mask = api_server.cigar_butt_mask(enriched, peMax=15, pbMax=1.5)
+            rows = api_server.sorted_order(enriched, 'pb', 'asc', mask)
+            fast_json.dumps(api_server.page_response(snapshot, enriched, rows, 0, 50, key))
+
+        results.append({'name': 'filter_stocks', 'size': size, **measure(run, args.repeat)})
+    return results
+
+
+def http_paths(rng: random.Random) -> Dict[str, List[str]]:
+    """压测请求：固定查询（命中响应缓存）与变化的查询（大多需要重新筛选）"""
+    varied = [
+        f'/api/stocks/filter?market=a股&pbMax={rng.choice(range(5, 40)) / 10}&peMax={rng.choice([10, 15, 20, 30])}'
+        f'&page={rng.randint(1, 3)}&pageSize=50'
+        for _ in range(200)
+    ]
+    return {
+        'filter_cached': ['/api/stocks/filter?market=a股&peMax=15&pbMax=1.5&pageSize=50'],
+        'filter_varied': varied,
+        'list_sorted': ['/api/stocks/a-share?pageSize=100&sortBy=marketCap&order=desc'],
+    }
+
+
+def bench_http(args, fake_url: str) -> List[dict]:
+    results = []
+    workdir = tempfile.mkdtemp(prefix='cigar-bench-')
+    for size in args.sizes:
+        universe_file = os.path.join(workdir, f'universe-{size}.json')
+        write_universe(universe_file, size)
+        env = dict(
+            os.environ,
+            CIGAR_QUOTE_URL=fake_url + '/q=',
+            CIGAR_UNIVERSE_FILE=universe_file,
+            CIGAR_HISTORY_INTERVAL='0',
+            CIGAR_DIVIDEND_CACHE=os.path.join(workdir, 'dividends.json'),
+            CIGAR_REFRESH_TRADING=str(args.interval),
+            CIGAR_REFRESH_IDLE=str(args.interval),
+        )
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'api_server.py'), '--port', str(args.port)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        url = f'http://127.0.0.1:{args.port}'
+        try:
+            asyncio.run(wait_ready(url))
+            for name, paths in http_paths(random.Random(args.seed)).items():
+                result = asyncio.run(load(url, args.duration, args.concurrency, paths))
+                results.append({'name': name, 'size': size, **result, **rss_mb(server.pid)})
+        finally:
+            server.terminate()
+            server.wait()
+    return results
+
+
+def import_cost(env: dict, preload: str = '', repeat: int = 5) -> dict:
+    """多次在新进程中导入 api_server，取导入耗时的中位数和常驻内存"""
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_PROBE.format(preload=preload)],
+                                         cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+        samples.append(json.loads(output.decode().strip().splitlines()[-1]))
+    samples.sort(key=lambda r: r['import_ms'])
+    median = samples[len(samples) // 2]
+    return {
+        'import_ms': median['import_ms'],
+        'rss_mb': round(median['rss_kb'] / 1024, 1) if median['rss_kb'] else None,
+        'peak_rss_mb': round(median['peak_kb'] / 1024, 1) if median['peak_kb'] else None,
+    }
+
+
+def get_status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+
+def time_to_ready(args, env: dict, workers: int = 1) -> dict:
+    """
+    启动 api_server 进程，直到 /api/ready 返回 200 的耗时，以及就绪后第一个筛选请求的耗时
+    workers > 1 时以多 worker 方式启动（刷新进程 + 共享快照），同时作为多 worker 启动的冒烟检查
+    """
+    url = f'http://127.0.0.1:{args.port}'
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'api_server.py'), '--port', str(args.port), '--workers', str(workers)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + 60
+        while get_status(url + '/api/ready') != 200:
+            if time.perf_counter() > deadline or server.poll() is not None:
+                raise RuntimeError('api_server 未能就绪')
+            time.sleep(0.02)
+        ready = time.perf_counter() - start
+
+        first = time.perf_counter()
+        status = get_status(url + '/api/stocks/filter?market=' + urllib.parse.quote('a股') + '&peMax=15&pbMax=1.5&pageSize=50')
+        first_request = time.perf_counter() - first
+        if status != 200:
+            raise RuntimeError(f'就绪后的筛选请求失败: HTTP {status}')
+        return {'ready_ms': round(ready * 1000, 1), 'first_request_ms': round(first_request * 1000, 1),
+                'server_rss_mb': rss_mb(server.pid)['rss_mb']}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def bench_startup(args, fake_url: str) -> List[dict]:
+    results = []
+    workdir = tempfile.mkdtemp(prefix='cigar-bench-')
+    try:
+        import importlib.util
+        has_akshare = importlib.util.find_spec('akshare') is not None
+    except ValueError:
+        has_akshare = False
+
+    for size in args.sizes:
+        universe_file = os.path.join(workdir, f'universe-{size}.json')
+        write_universe(universe_file, size)
+        env = dict(
+            os.environ,
+            CIGAR_QUOTE_URL=fake_url + '/q=',
+            CIGAR_UNIVERSE_FILE=universe_file,
+            CIGAR_HISTORY_INTERVAL='0',
+            CIGAR_DIVIDEND_CACHE=os.path.join(workdir, 'dividends.json'),
+            CIGAR_SCREENS_FILE=os.path.join(workdir, 'screens.json'),
+        )
+        results.append({'name': 'import', 'size': size, **import_cost(env)})
+        if has_akshare:
+            results.append({'name': 'import_with_akshare', 'size': size,
+                            **import_cost(env, preload='import akshare')})
+        results.append({'name': 'ready', 'size': size, **time_to_ready(args, env)})
+        shared_env = dict(env, CIGAR_SHARED_DIR=os.path.join(workdir, f'shared-{size}'))
+        results.append({'name': 'ready_workers_2', 'size': size, **time_to_ready(args, shared_env, workers=2)})
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, previous: dict):
+    """按 (套件, 名称, 规模) 对比两次结果的主要指标"""
+    def index(report):
+        return {(suite, r['name'], r['size']): r for suite, rows in report['results'].items() for r in rows}
+
+    old = index(previous)
+    print(f"\n与 {previous['meta'].get('revision')} ({previous['meta'].get('time')}) 对比:")
+    print(f"{'套件':<8}{'名称':<24}{'规模':>6}  {'指标':<10}{'之前':>10}{'现在':>10}{'变化':>9}")
+    for key, row in index(current).items():
+        before = old.get(key)
+        if before is None:
+            continue
+        for metric, higher_is_better in COMPARE_METRICS.items():
+            a, b = before.get(metric), row.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a * 100
+            worse = change < 0 if higher_is_better else change > 0
+            flag = ' !' if worse and abs(change) >= 10 else ''
+            print(f"{key[0]:<8}{key[1]:<24}{key[2]:>6}  {metric:<10}{a:>10}{b:>10}{change:>+8.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='基准测试套件')
+    parser.add_argument('--suites', default=','.join(SUITES), help='要运行的套件: ' + ','.join(SUITES))
+    parser.add_argument('--sizes', default='500,5000', help='股票池规模（A 股数量）')
+    parser.add_argument('--repeat', type=int, default=30, help='parse / fetch / filter 每项的运行次数')
+    parser.add_argument('--latency', type=float, default=0.02, help='模拟行情服务的响应延迟（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟行情服务返回 503 的比例')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--upstream-rate', type=float, default=0,
+                        help='api_server 的上游限速（CIGAR_UPSTREAM_RATE，默认 0 不限速，测量抓取本身）')
+    parser.add_argument('--duration', type=float, default=10, help='每组 HTTP 压测时长（秒）')
+    parser.add_argument('--concurrency', type=int, default=64, help='HTTP 压测并发连接数')
+    parser.add_argument('--interval', type=float, default=10, help='HTTP 压测时 api_server 的快照刷新间隔（秒）')
+    parser.add_argument('--port', type=int, default=8200)
+    parser.add_argument('--fake-port', type=int, default=9200)
+    parser.add_argument('--output', help='结果文件（默认 bench/results/<时间>.json）')
+    parser.add_argument('--compare', help='与之前的结果文件对比')
+    args = parser.parse_args()
+    args.sizes = [int(n) for n in args.sizes.split(',') if n]
+    suites = [s for s in args.suites.split(',') if s]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"未知的套件: {','.join(sorted(unknown))}")
+
+    # 模拟行情服务运行在独立进程中，避免与被测代码争用 GIL
+    fake = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'fake_quote_server.py'), '--port', str(args.fake_port),
+         '--latency', str(args.latency), '--error-rate', str(args.error_rate), '--seed', str(args.seed)],
+        stdout=subprocess.DEVNULL,
+    )
+    fake_url = f'http://127.0.0.1:{args.fake_port}'
+    os.environ['CIGAR_QUOTE_URL'] = fake_url + '/q='
+    os.environ['CIGAR_HISTORY_INTERVAL'] = '0'
+    os.environ['CIGAR_UPSTREAM_RATE'] = str(args.upstream_rate)
+    time.sleep(1)
+
+    import api_server
+
+    results = {}
+    try:
+        for suite in suites:
+            print(f"运行 {suite} ...", flush=True)
+            if suite in ('http', 'startup'):
+                results[suite] = globals()[f'bench_{suite}'](args, fake_url)
+            else:
+                results[suite] = globals()[f'bench_{suite}'](args, api_server)
+    finally:
+        fake.terminate()
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        },
+        'results': results,
+    }
+
+    for suite, rows in results.items():
+        print(f"\n[{suite}]")
+        for row in rows:
+            print('  ' + ', '.join(f'{k}={v}' for k, v in row.items()))
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
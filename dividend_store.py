@@ -0,0 +1,246 @@
+"""
+烟蒂股筛选器 - 分红数据
+按报告期批量拉取全市场分红方案（akshare stock_fhps_em），计算近 12 个月每股现金分红，
+股息率 = 每股分红 / 当前价格，在每个快照上向量化计算
+
+磁盘缓存（JSON）:
+    {
+      "schema": 1,
+      "version": 3,                                 # 数据每变化一次加一
+      "periods": {
+        "20231231": {"fetched": 1700000000.0,       # 报告期 -> 分红方案
+                     "rows": [["sh600036", 1.972, "20240711"], ...]}
+      }
+    }
+
+- 已结束的报告期（距今超过 OPEN_PERIOD_DAYS）不再变化，只拉取一次
+- 仍可能有新方案/除息日的报告期超过 TTL 后重新拉取（每日增量刷新）
+- 超出统计窗口的报告期从缓存中淘汰
+- 离线运行时可用本地文件（code,dps 的 CSV）补充或替代
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+CACHE_SCHEMA = 1
+
+# 统计窗口：近 12 个月除息的方案；报告期往前取两年即可覆盖
+TTM_DAYS = 365
+WINDOW_PERIODS = 8
+# 报告期结束后这么多天内仍可能公布方案或除息
+OPEN_PERIOD_DAYS = 550
+
+# 沪深代码前缀（akshare 返回 6 位代码）
+CODE_PREFIXES = {'6': 'sh', '9': 'sh', '0': 'sz', '2': 'sz', '3': 'sz', '4': 'bj', '8': 'bj'}
+
+
+def report_periods(today: date, count: int = WINDOW_PERIODS) -> List[str]:
+    """截至 today 的最近 count 个季度报告期（YYYYMMDD，新的在前）"""
+    ends = ['0331', '0630', '0930', '1231']
+    year, quarter = today.year, (today.month - 1) // 3  # 当前季度之前的最后一个季度末
+    periods = []
+    while len(periods) < count:
+        if quarter == 0:
+            year, quarter = year - 1, 4
+        periods.append(f'{year}{ends[quarter - 1]}')
+        quarter -= 1
+    return periods
+
+
+def full_code(code: str) -> Optional[str]:
+    prefix = CODE_PREFIXES.get(code[:1])
+    return prefix + code if prefix and len(code) == 6 else None
+
+
+def fetch_period(period: str) -> List[list]:
+    """拉取一个报告期的全市场分红方案: [[代码, 每股现金分红, 除权除息日], ...]"""
+    import akshare as ak  # 拉取较慢且依赖较重，只在需要时导入
+
+    df = ak.stock_fhps_em(date=period)
+    rows = []
+    for code, per_ten, ex_date in zip(df['代码'], df['现金分红-现金分红比例'], df['除权除息日']):
+        code = full_code(str(code))
+        try:
+            dps = float(per_ten) / 10  # 每 10 股派现 -> 每股
+        except (TypeError, ValueError):
+            continue
+        if code is None or not dps > 0:
+            continue
+        ex = str(ex_date)[:10].replace('-', '') if ex_date is not None and str(ex_date) not in ('', 'NaT', 'nan') else ''
+        rows.append([code, round(dps, 6), ex])
+    return rows
+
+
+def load_local_file(path: str) -> Dict[str, float]:
+    """本地分红文件：CSV，表头 code,dps（近 12 个月每股现金分红）"""
+    result = {}
+    with open(path, encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            try:
+                result[row['code'].strip()] = float(row['dps'])
+            except (KeyError, TypeError, ValueError):
+                continue
+    return result
+
+
+class DividendStore:
+    """
+    每股分红（近 12 个月）的内存索引 + 磁盘缓存
+    查询只读内存中的 dict，刷新在后台线程完成后整体替换
+    """
+
+    def __init__(self, cache_path: str, ttl: float = 86400, local_file: Optional[str] = None):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.local_file = local_file
+        self.version = 0
+        self.updated_at = 0.0
+        self.source = 'none'
+        self._periods: Dict[str, dict] = {}
+        self._dps: Dict[str, float] = {}
+        self._cache_mtime = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._dps)
+
+    # ========== 磁盘缓存 ==========
+
+    def load(self):
+        """启动时读取磁盘缓存和本地文件（不访问网络）"""
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, encoding='utf-8') as f:
+                    cache = json.load(f)
+                if cache.get('schema') == CACHE_SCHEMA:
+                    self._periods = cache.get('periods', {})
+                    self.version = int(cache.get('version', 0))
+                    self.source = 'cache'
+                self._cache_mtime = os.stat(self.cache_path).st_mtime_ns
+            except (OSError, ValueError) as e:
+                print(f"读取分红缓存失败: {e}")
+        self._rebuild()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        tmp = self.cache_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'schema': CACHE_SCHEMA, 'version': self.version, 'periods': self._periods}, f)
+        os.replace(tmp, self.cache_path)
+        self._cache_mtime = os.stat(self.cache_path).st_mtime_ns
+
+    def reload_if_changed(self) -> bool:
+        """多进程部署时只由刷新进程拉取，其他进程在缓存文件更新后重新加载"""
+        try:
+            mtime = os.stat(self.cache_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._cache_mtime:
+            return False
+        self.load()
+        return True
+
+    # ========== 刷新 ==========
+
+    def stale_periods(self, now: Optional[float] = None) -> List[str]:
+        """需要（重新）拉取的报告期"""
+        now = now or time.time()
+        today = datetime.fromtimestamp(now).date()
+        stale = []
+        for period in report_periods(today):
+            cached = self._periods.get(period)
+            if cached is None:
+                stale.append(period)
+                continue
+            is_open = (today - datetime.strptime(period, '%Y%m%d').date()).days <= OPEN_PERIOD_DAYS
+            if is_open and now - cached['fetched'] > self.ttl:
+                stale.append(period)
+        return stale
+
+    def refresh(self) -> bool:
+        """拉取过期的报告期并更新缓存（阻塞，应在线程池中调用），每股分红有变化时返回 True"""
+        with self._lock:
+            now = time.time()
+            fetched = False
+            for period in self.stale_periods(now):
+                try:
+                    rows = fetch_period(period)
+                except ImportError:
+                    print("未安装 akshare，跳过分红数据拉取")
+                    break
+                except Exception as e:
+                    print(f"获取分红数据失败 ({period}): {e}")
+                    continue
+                self._periods[period] = {'fetched': now, 'rows': rows}
+                self.source = 'akshare'
+                fetched = True
+
+            # 淘汰超出统计窗口的报告期
+            window = set(report_periods(datetime.fromtimestamp(now).date()))
+            for period in [p for p in self._periods if p not in window]:
+                del self._periods[period]
+                fetched = True
+
+            # 统计窗口随日期移动，即使没有拉取也重新汇总
+            previous = self._dps
+            self._rebuild()
+            changed = self._dps != previous
+            if changed:
+                self.version += 1
+            if fetched or changed:
+                self._save()
+            return changed
+
+    def _rebuild(self):
+        """由各报告期的方案汇总近 12 个月（按除息日）的每股分红"""
+        floor = (date.today() - timedelta(days=TTM_DAYS)).strftime('%Y%m%d')
+        today = date.today().strftime('%Y%m%d')
+
+        dps: Dict[str, float] = {}
+        if self.local_file and os.path.exists(self.local_file):
+            dps.update(load_local_file(self.local_file))
+            if self.source == 'none':
+                self.source = 'file'
+
+        from_periods: Dict[str, float] = {}
+        for period in self._periods.values():
+            for code, value, ex_date in period['rows']:
+                if ex_date and floor <= ex_date <= today:
+                    from_periods[code] = from_periods.get(code, 0.0) + value
+        dps.update(from_periods)
+
+        self._dps = dps
+        self.updated_at = max((p['fetched'] for p in self._periods.values()), default=0.0)
+
+    # ========== 查询 ==========
+
+    def per_share(self, code: str) -> Optional[float]:
+        return self._dps.get(code)
+
+    def yields(self, codes: np.ndarray, prices: np.ndarray, fallback: np.ndarray) -> np.ndarray:
+        """
+        按当前价格计算股息率（小数）
+        没有分红数据或价格无效的股票保留 fallback（行情接口自带的股息率）
+        """
+        dps = self._dps
+        values = np.fromiter((dps.get(code, np.nan) for code in codes), dtype=np.float64, count=len(codes))
+        known = ~np.isnan(values) & (prices > 0)
+        result = np.array(fallback, dtype=np.float64)
+        result[known] = values[known] / prices[known]
+        return result
+
+    def stats(self) -> dict:
+        return {
+            'version': self.version,
+            'codes': len(self._dps),
+            'periods': sorted(self._periods),
+            'source': self.source,
+            'updatedAt': self.updated_at,
+        }
@@ -0,0 +1,25 @@
+"""
+烟蒂股筛选器 - 响应序列化
+接口返回的都是基本类型（dict / list / str / 数字），直接生成 UTF-8 字节，不经过 FastAPI 的 jsonable_encoder：
+- 安装了 orjson 时使用 orjson（C 实现，比标准库快一个数量级）
+- 否则退回标准库 json，输出与 JSONResponse 相同
+设置 CIGAR_FAST_JSON=0 可强制使用标准库
+"""
+
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+ENABLED = orjson is not None and os.environ.get('CIGAR_FAST_JSON', '1') != '0'
+BACKEND = 'orjson' if ENABLED else 'json'
+
+
+def dumps(payload) -> bytes:
+    """序列化为 UTF-8 字节；NaN / inf 在 orjson 下输出为 null，标准库下报错（与 JSONResponse 一致）"""
+    if ENABLED:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
@@ -0,0 +1,202 @@
+"""
+烟蒂股筛选器 - 历史快照存储
+每次刷新的行情快照按市场、按天追加到定长记录文件中，读取时通过 mmap 零拷贝访问
+
+目录结构:
+    {root}/{market}/{YYYYMMDD}.bin     定长行情记录（RECORD_DTYPE）
+    {root}/{market}/{YYYYMMDD}.idx     快照索引（INDEX_DTYPE：时间戳、起始记录、记录数）
+    {root}/{market}/{YYYYMMDD}.names   代码 -> 名称（JSON）
+
+先写记录再写索引，读取方只看得到已完整写入的快照
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from quote_table import FLOAT_FIELDS, INT_FIELDS, QuoteTable
+
+# 单条行情记录
+RECORD_DTYPE = np.dtype(
+    [('code', 'S10')]
+    + [(field, '<f8') for field in FLOAT_FIELDS]
+    + [(field, '<i8') for field in INT_FIELDS]
+)
+
+# 快照索引
+INDEX_DTYPE = np.dtype([('ts', '<f8'), ('offset', '<i8'), ('count', '<i8')])
+
+# 市场 -> 目录名
+MARKET_DIRS = {'a股': 'a', '港股': 'hk', 'indices': 'indices'}
+
+# 同时保持打开的 mmap 文件数
+MMAP_CACHE_SIZE = 32
+
+
+def day_of(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime('%Y%m%d')
+
+
+class HistoryEntry:
+    """一个历史快照在文件中的位置"""
+
+    __slots__ = ('market', 'day', 'ts', 'offset', 'count')
+
+    def __init__(self, market: str, day: str, ts: float, offset: int, count: int):
+        self.market = market
+        self.day = day
+        self.ts = ts
+        self.offset = offset
+        self.count = count
+
+
+class HistoryStore:
+    """按天分文件的列式历史快照存储"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._mmaps: 'OrderedDict[str, np.memmap]' = OrderedDict()
+        self._names: Dict[Tuple[str, str], Dict[str, str]] = {}
+
+    def _path(self, market: str, day: str, ext: str) -> str:
+        return os.path.join(self.root, MARKET_DIRS[market], f'{day}.{ext}')
+
+    # ========== 写入 ==========
+
+    def append(self, market: str, table: QuoteTable, ts: float):
+        """追加一个快照"""
+        if not len(table):
+            return
+
+        day = day_of(ts)
+        records = np.zeros(len(table), dtype=RECORD_DTYPE)
+        records['code'] = [code.encode() for code in table.codes]
+        for field in FLOAT_FIELDS + INT_FIELDS:
+            records[field] = table[field]
+
+        with self._lock:
+            os.makedirs(os.path.dirname(self._path(market, day, 'bin')), exist_ok=True)
+
+            bin_path = self._path(market, day, 'bin')
+            offset = os.path.getsize(bin_path) // RECORD_DTYPE.itemsize if os.path.exists(bin_path) else 0
+            with open(bin_path, 'ab') as f:
+                f.write(records.tobytes())
+
+            self._update_names(market, day, table)
+
+            index = np.array([(ts, offset, len(records))], dtype=INDEX_DTYPE)
+            with open(self._path(market, day, 'idx'), 'ab') as f:
+                f.write(index.tobytes())
+
+    def _update_names(self, market: str, day: str, table: QuoteTable):
+        names = self._load_names(market, day)
+        new_names = {code: name for code, name in zip(table.codes, table.names) if names.get(code) != name}
+        if new_names:
+            names.update(new_names)
+            path = self._path(market, day, 'names')
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(names, f, ensure_ascii=False)
+            os.replace(path + '.tmp', path)
+
+    def _load_names(self, market: str, day: str) -> Dict[str, str]:
+        key = (market, day)
+        if key not in self._names:
+            path = self._path(market, day, 'names')
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    self._names[key] = json.load(f)
+            else:
+                self._names[key] = {}
+        return self._names[key]
+
+    # ========== 读取 ==========
+
+    def days(self, market: str) -> List[str]:
+        """有历史数据的日期（升序）"""
+        directory = os.path.join(self.root, MARKET_DIRS[market])
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-4] for name in os.listdir(directory) if name.endswith('.idx'))
+
+    def entries(self, market: str, day: str) -> List[HistoryEntry]:
+        """某一天的全部快照（按时间升序）"""
+        path = self._path(market, day, 'idx')
+        if not os.path.exists(path):
+            return []
+        index = np.fromfile(path, dtype=INDEX_DTYPE)
+        return [HistoryEntry(market, day, float(ts), int(offset), int(count)) for ts, offset, count in index]
+
+    def range(self, market: str, start: float, end: float) -> List[HistoryEntry]:
+        """时间范围内的全部快照"""
+        first, last = day_of(start), day_of(end)
+        result = []
+        for day in self.days(market):
+            if first <= day <= last:
+                result.extend(e for e in self.entries(market, day) if start <= e.ts <= end)
+        return result
+
+    def at(self, market: str, ts: float, lookback_days: int = 30) -> Optional[HistoryEntry]:
+        """不晚于 ts 的最近一个快照"""
+        days = [d for d in self.days(market) if d <= day_of(ts)]
+        floor = day_of(ts - lookback_days * 86400)
+        for day in reversed(days):
+            if day < floor:
+                break
+            entries = [e for e in self.entries(market, day) if e.ts <= ts]
+            if entries:
+                return entries[-1]
+        return None
+
+    def _mmap(self, market: str, day: str, required: int) -> np.memmap:
+        """打开（或复用）某天的记录文件；文件增长超过已映射长度时重新映射"""
+        path = self._path(market, day, 'bin')
+        with self._lock:
+            mm = self._mmaps.get(path)
+            if mm is None or len(mm) < required:
+                mm = np.memmap(path, dtype=RECORD_DTYPE, mode='r')
+                self._mmaps[path] = mm
+                if len(self._mmaps) > MMAP_CACHE_SIZE:
+                    self._mmaps.popitem(last=False)
+            else:
+                self._mmaps.move_to_end(path)
+        return mm
+
+    def load(self, entry: HistoryEntry) -> QuoteTable:
+        """读取一个历史快照：数值列直接是 mmap 上的视图，不复制数据"""
+        mm = self._mmap(entry.market, entry.day, entry.offset + entry.count)
+        records = mm[entry.offset:entry.offset + entry.count]
+
+        codes = np.array([code.decode() for code in records['code']], dtype=object)
+        names = self._load_names(entry.market, entry.day)
+        columns = {field: records[field] for field in FLOAT_FIELDS + INT_FIELDS}
+        return QuoteTable(codes, np.array([names.get(c, '--') for c in codes], dtype=object), columns)
+
+
+# 支持的时间格式及其精度
+TIME_FORMATS = [
+    ('%Y-%m-%d %H:%M:%S', timedelta(seconds=1)),
+    ('%Y-%m-%d %H:%M', timedelta(minutes=1)),
+    ('%Y-%m-%d', timedelta(days=1)),
+]
+
+
+def parse_time(value: str, inclusive: bool = False) -> float:
+    """
+    解析 'YYYY-MM-DD HH:MM:SS' / 'YYYY-MM-DD HH:MM' / 'YYYY-MM-DD' 为时间戳
+    inclusive=True 时取该精度区间的末尾（如纯日期取当天结束）
+    """
+    for fmt, precision in TIME_FORMATS:
+        try:
+            dt = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if inclusive:
+            dt += precision - timedelta(microseconds=1)
+        return dt.timestamp()
+    raise ValueError(f"无法识别的时间: {value}")
@@ -9,6 +9,22 @@ const API_BASE_URL = window.location.hostname === 'localhost'
     : 'http://' + window.location.hostname + ':8000';
 
 const API = {
+    /**
+     * 解析列表接口的返回数据
+     * format=columns 时字段名只出现一次（result.columns），data 为值数组，这里还原为对象
+     */
+    decodeStocks(result) {
+        if (!result.columns) return result.data;
+        const columns = result.columns;
+        return result.data.map(values => {
+            const stock = {};
+            for (let i = 0; i < columns.length; i++) {
+                stock[columns[i]] = values[i];
+            }
+            return stock;
+        });
+    },
+
     /**
      * 获取市场指数
      */
@@ -39,13 +55,13 @@ const API = {
     async getAStockList(page = 1, pageSize = 100) {
         try {
             const response = await fetch(
-                `${API_BASE_URL}/api/stocks/a-share?page=${page}&pageSize=${pageSize}`
+                `${API_BASE_URL}/api/stocks/a-share?page=${page}&pageSize=${pageSize}&format=columns`
             );
             const result = await response.json();
 
             if (result.success) {
                 return {
-                    stocks: result.data,
+                    stocks: this.decodeStocks(result),
                     total: result.total,
                     page: result.page,
                     pageSize: result.pageSize,
@@ -64,13 +80,13 @@ const API = {
     async getHKStockList(page = 1, pageSize = 100) {
         try {
             const response = await fetch(
-                `${API_BASE_URL}/api/stocks/hk?page=${page}&pageSize=${pageSize}`
+                `${API_BASE_URL}/api/stocks/hk?page=${page}&pageSize=${pageSize}&format=columns`
             );
             const result = await response.json();
 
             if (result.success) {
                 return {
-                    stocks: result.data,
+                    stocks: this.decodeStocks(result),
                     total: result.total,
                     page: result.page,
                     pageSize: result.pageSize,
@@ -114,6 +130,7 @@ const API = {
                 market,
                 page: String(page),
                 pageSize: String(pageSize),
+                format: 'columns',
             });
 
             if (peMax !== undefined && peMax !== null) {
@@ -144,7 +161,7 @@ const API = {
 
             if (result.success) {
                 return {
-                    stocks: result.data,
+                    stocks: this.decodeStocks(result),
                     total: result.total,
                     page: result.page,
                     pageSize: result.pageSize,
@@ -158,6 +175,118 @@ const API = {
         }
     },
 
+    /**
+     * 按自定义策略筛选（后端执行，支持计算条件和混合逻辑）
+     * 第一页 cursor 为空；后续页传入上一页的 nextCursor，所有页都来自同一个快照
+     */
+    async filterByStrategy(market, strategy, cursor = null, pageSize = 500) {
+        const response = await fetch(`${API_BASE_URL}/api/stocks/filter`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                market,
+                strategy: { conditions: strategy.conditions },
+                cursor,
+                pageSize,
+                format: 'columns',
+            }),
+        });
+        const result = await response.json();
+
+        if (!response.ok || !result.success) {
+            throw new Error(result.error || `HTTP error! status: ${response.status}`);
+        }
+
+        return {
+            stocks: this.decodeStocks(result),
+            total: result.total,
+            page: result.page,
+            pageSize: result.pageSize,
+            nextCursor: result.nextCursor,
+            updateTime: result.updateTime,
+        };
+    },
+
+    /**
+     * 批量筛选：多组条件一次请求，共用同一个快照
+     * screens: [{ id, market, peMax, pbMax, dividendYieldMin, marketCapMax, strategy, sector, sortBy, order, limit }]
+     * 返回与 screens 顺序一致的 [{ id, market, total, stocks }]
+     */
+    async filterBatch(screens) {
+        const response = await fetch(`${API_BASE_URL}/api/stocks/filter/batch`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ screens, format: 'columns' }),
+        });
+        const result = await response.json();
+
+        if (!response.ok || !result.success) {
+            throw new Error(result.error || `HTTP error! status: ${response.status}`);
+        }
+
+        return result.data.map(item => ({
+            id: item.id,
+            market: item.market,
+            total: item.total,
+            stocks: this.decodeStocks(item),
+            updateTime: result.markets[item.market].updateTime,
+        }));
+    },
+
+    /**
+     * 订阅实时行情（SSE）
+     * 首条消息为完整快照，之后只推送变化的字段；本地维护 代码 -> 股票 的映射并原地更新
+     * onUpdate(stocks, changedCodes)：快照时 changedCodes 为 null
+     * 返回取消订阅的函数
+     */
+    streamQuotes(market, onUpdate) {
+        const stocks = new Map();
+        let version = 0;
+        let source = null;
+
+        const connect = () => {
+            source = new EventSource(
+                `${API_BASE_URL}/api/stream?market=${encodeURIComponent(market)}&format=sse`
+            );
+
+            source.addEventListener('snapshot', (event) => {
+                const message = JSON.parse(event.data);
+                stocks.clear();
+                message.data.forEach(stock => stocks.set(stock.code, stock));
+                version = message.version;
+                onUpdate(stocks, null, message.updateTime);
+            });
+
+            source.addEventListener('delta', (event) => {
+                const message = JSON.parse(event.data);
+                if (message.base !== version) {
+                    // 中间有遗漏：重新建立连接（新连接不带 Last-Event-ID，服务端会先发送完整快照）
+                    console.warn(`实时行情版本不连续 (${version} -> ${message.base})，重新同步`);
+                    source.close();
+                    version = 0;
+                    connect();
+                    return;
+                }
+
+                // 没有变化的刷新也会推送（changes 为空），保证版本连续
+                const changed = Object.keys(message.changes);
+                changed.forEach(code => {
+                    const stock = stocks.get(code);
+                    if (stock) Object.assign(stock, message.changes[code]);
+                });
+                version = message.version;
+                if (changed.length) onUpdate(stocks, changed, message.updateTime);
+            });
+
+            source.onerror = (error) => {
+                console.error('实时行情连接中断，自动重连中:', error);
+            };
+        };
+
+        connect();
+        return () => source.close();
+    },
+
     // ========== 模拟数据（备用） ==========
 
     getMockIndices() {
@@ -15,6 +15,8 @@ const AppState = {
     filteredStocks: [],
     strategyEditor: null,
     currentStrategy: null,
+    // 实时行情订阅（取消函数）
+    quoteStreams: {},
     // 排序状态
     sortBy: null,
     sortOrder: 'asc', // 'asc' 或 'desc'
@@ -38,6 +40,10 @@ async function initApp() {
     // 加载市场数据
     await loadMarketData();
 
+    // 订阅实时行情（指数 + 当前市场）
+    subscribeQuotes('indices');
+    subscribeQuotes(AppState.market);
+
     console.log('⚡️ 烟蒂股筛选器已加载');
 }
 
@@ -169,6 +175,11 @@ function applyTheme(theme) {
 
 // 市场切换
 function switchMarket(market) {
+    if (market !== AppState.market) {
+        AppState.quoteStreams[AppState.market]?.();
+        delete AppState.quoteStreams[AppState.market];
+        subscribeQuotes(market);
+    }
     AppState.market = market;
 
     if (market === 'a股') {
@@ -214,6 +225,32 @@ async function refreshMarketData() {
     }
 }
 
+// 订阅实时行情：服务端刷新后只推送变化的字段
+function subscribeQuotes(market) {
+    if (AppState.quoteStreams[market]) return;
+
+    AppState.quoteStreams[market] = API.streamQuotes(market, (stocks, changedCodes) => {
+        if (market === 'indices') {
+            updateMarketOverview(Array.from(stocks.values()));
+            return;
+        }
+        if (market !== AppState.market || AppState.currentView !== 'results') return;
+
+        // 原地更新当前结果中的股票，只在当前页有变化时重新渲染
+        const changed = changedCodes ? new Set(changedCodes) : null;
+        let visibleChanged = false;
+        const start = (AppState.currentPage - 1) * AppState.pageSize;
+        AppState.filteredStocks.forEach((stock, i) => {
+            if (changed && !changed.has(stock.code)) return;
+            const latest = stocks.get(stock.code);
+            if (!latest) return;
+            Object.assign(stock, latest);
+            if (i >= start && i < start + AppState.pageSize) visibleChanged = true;
+        });
+        if (visibleChanged) renderTable();
+    });
+}
+
 // 更新市场概览
 function updateMarketOverview(indices) {
     const container = document.querySelector('.grid.grid-cols-2.md\\:grid-cols-4');
@@ -924,56 +961,24 @@ async function runCustomStrategy() {
     try {
         showLoading();
 
-        // 检查是否有计算条件
-        const hasCalcCondition = AppState.strategyEditor.conditions.some(c => c.type === 'calc');
-
-        if (hasCalcCondition) {
-            // 有计算条件：先获取所有股票，然后前端筛选
-            const params = { market: AppState.market };
-            const result = await Cache.getStockList(AppState.market);
-            const allStocks = result.stocks || [];
-
-            // 前端筛选（支持计算条件）
-            const filtered = AppState.strategyEditor.filterStocks(allStocks);
-
-            AppState.currentTemplate = 'custom';
-            AppState.filteredStocks = filtered;
-            AppState.totalResults = filtered.length;
-            AppState.currentPage = 1;
-        } else {
-            // 只有简单条件：使用后端筛选
-            // 获取所有符合条件的股票（不分页）
-            const allStocks = [];
-            let page = 1;
-            let hasMore = true;
-            
-            // 获取基础参数（不含页码）
-            const baseParams = AppState.strategyEditor.toBackendParams(AppState.market);
-            
-            while (hasMore && page <= 5) { // 最多5页，防止无限循环
-                const params = { ...baseParams, page: page };
-                
-                // 跳过缓存，直接请求
-                const data = await API.filterStocks(params);
-                const stocks = data.stocks || [];
-                
-                if (stocks.length === 0) {
-                    hasMore = false;
-                } else {
-                    allStocks.push(...stocks);
-                    page++;
-                    // 如果返回的数据少于pageSize，说明没有更多数据了
-                    if (stocks.length < 200) {
-                        hasMore = false;
-                    }
-                }
-            }
-
-            AppState.currentTemplate = 'custom';
-            AppState.filteredStocks = allStocks;
-            AppState.totalResults = allStocks.length;
-            AppState.currentPage = 1;
-        }
+        // 后端按策略筛选（支持计算条件和混合逻辑），只返回命中的股票
+        const strategy = AppState.strategyEditor.getStrategy();
+        // 按 nextCursor 翻页：各页来自同一个快照，翻页期间后台刷新不会造成重复或遗漏
+        const allStocks = [];
+        let cursor = null;
+        let pages = 0;
+
+        do {
+            const data = await API.filterByStrategy(AppState.market, strategy, cursor);
+            allStocks.push(...(data.stocks || []));
+            cursor = data.nextCursor;
+            pages++;
+        } while (cursor && pages < 10); // 最多10页，防止无限循环
+
+        AppState.currentTemplate = 'custom';
+        AppState.filteredStocks = allStocks;
+        AppState.totalResults = allStocks.length;
+        AppState.currentPage = 1;
 
         // 构建模拟模板对象用于显示
         const customTemplate = {
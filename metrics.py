@@ -0,0 +1,277 @@
+"""
+烟蒂股筛选器 - 运行指标
+进程内的计数器 / 仪表 / 直方图，以 Prometheus 文本格式输出（/metrics），不依赖 prometheus_client：
+- 记录一次观测只是几次整数加法和一次二分查找，可以常开
+- 快照时长、缓存命中率等由回调在抓取时计算，平时没有开销
+- 请求内各阶段耗时同时累计到当前请求的计时表，用于 Server-Timing 响应头
+多 worker 部署时每个进程各自统计
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 默认直方图分桶（秒）：覆盖 0.1ms ~ 10s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labels: Labels = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def samples(self) -> Iterable[Tuple[str, Labels, float]]:
+        """(指标名后缀, 标签值, 数值)"""
+        return ()
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for suffix, values, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labels, values)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Labels = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        return (('', labels, value) for labels, value in self._values.items())
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, labels: Labels = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def samples(self):
+        return (('', labels, value) for labels, value in self._values.items())
+
+
+class CallbackMetric(Metric):
+    """抓取时调用 collect() 取值：返回 {标签值元组: 数值}"""
+
+    def __init__(self, name: str, help: str, labels: Labels, collect: Callable[[], Dict[Labels, float]],
+                 kind: str = 'gauge'):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self):
+        return (('', labels, value) for labels, value in self.collect().items())
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Labels = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数..., +Inf 桶计数, 总和]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        bounds = self.buckets + (float('inf'),)
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}')
+            label_str = _format_labels(self.labels, labels)
+            lines.append(f'{self.name}_sum{label_str} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{label_str} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        注册指标；同名同类型的指标已存在时返回已有的指标
+        （多 worker 启动时 api_server.py 会被执行两次：作为 __mp_main__ 和被 uvicorn 导入的 api_server）
+        回调指标改用最后注册的回调，即实际提供服务的模块中的对象
+        """
+        existing = self._metrics.get(metric.name)
+        if existing is None:
+            self._metrics[metric.name] = metric
+            return metric
+        if existing.kind != metric.kind or existing.labels != metric.labels or type(existing) is not type(metric):
+            raise ValueError(f"重复的指标名: {metric.name}")
+        if isinstance(existing, CallbackMetric):
+            existing.collect = metric.collect
+        return existing
+
+    def counter(self, name: str, help: str, labels: Labels = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Labels = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Labels = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def callback(self, name: str, help: str, labels: Labels, collect: Callable[[], Dict[Labels, float]],
+                 kind: str = 'gauge') -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, labels, collect, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"输出指标 {metric.name} 失败: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    'cigar_stage_seconds', '各处理阶段耗时（upstream / parse / enrich / filter / build / serialize / compress）',
+    ('stage',))
+
+# 当前请求的阶段耗时表（阶段 -> 秒），由请求中间件设置；后台任务中为 None
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('request_timings', default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    stage_seconds.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str):
+    """统计一个阶段的耗时：写入阶段直方图，并计入当前请求的 Server-Timing"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def start_request_timing() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    """阶段耗时 -> Server-Timing 头（毫秒）"""
+    parts = [f'{stage};dur={seconds * 1000:.2f}' for stage, seconds in timings.items()]
+    parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts)
+
+
+http_requests = registry.counter('cigar_http_requests_total', 'HTTP 请求数', ('path', 'method', 'status'))
+http_request_seconds = registry.histogram('cigar_http_request_seconds', 'HTTP 请求耗时（到响应头发出为止）', ('path',))
+http_in_flight = registry.gauge('cigar_http_requests_in_flight', '正在处理的 HTTP 请求数')
+
+
+def route_label(scope) -> str:
+    """
+    请求的路由模板（/api/screens/{screen_id}），带路径参数的请求合并为一个标签；
+    没有匹配到路由的请求（404 等）合并为 unmatched，避免标签数量失控
+    """
+    route = scope.get('route')
+    if route is not None and hasattr(route, 'path'):
+        return route.path
+    return scope['path'] if 'endpoint' in scope else 'unmatched'
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI 中间件：统计请求数、耗时和并发数，并在响应头中附加 Server-Timing
+    长连接（实时推送）等 exclude 中的路径不计入，以免拉高耗时分布
+    """
+
+    def __init__(self, app, server_timing: bool = True, exclude: Tuple[str, ...] = ()):
+        self.app = app
+        self.server_timing = server_timing
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'].startswith(self.exclude):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = start_request_timing()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                elapsed = time.perf_counter() - start
+                path = route_label(scope)
+                http_request_seconds.observe(elapsed, path)
+                if self.server_timing:
+                    headers = list(message.get('headers', []))
+                    headers.append((b'server-timing', server_timing_header(timings, elapsed).encode()))
+                    headers.append((b'timing-allow-origin', b'*'))
+                    message = {**message, 'headers': headers}
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            path = route_label(scope)
+            http_requests.inc(path, scope['method'], str(status))
@@ -0,0 +1,149 @@
+"""
+烟蒂股筛选器 - 实时行情推送
+连接建立时推送一次完整快照，之后每次后台刷新只推送有变化的股票和字段
+
+消息（SSE 的 data 或 NDJSON 的一行）:
+    {"type": "snapshot", "version": 12, "updateTime": "...", "data": [{...}, ...]}
+    {"type": "delta", "version": 13, "base": 12, "updateTime": "...",
+     "changes": {"sh600036": {"price": 35.2, "changePercent": 1.2, "volume": 123456}}}
+    {"type": "ping"}
+
+每次刷新都会推送 delta（没有变化时 changes 为空），客户端据此校验版本连续（base 等于本地版本）
+每条消息只序列化一次（紧凑格式，见 fast_json），所有连接共享；每个连接有独立的有界队列，
+消费过慢导致队列写满时丢弃积压的增量，改为下一次推送完整快照（重新同步）
+"""
+
+import asyncio
+from typing import Callable, Dict, Optional, Set, Tuple
+
+import numpy as np
+
+import fast_json
+from quote_table import QuoteTable, diff_columns
+
+
+def _dumps(payload: dict) -> str:
+    return fast_json.dumps(payload).decode('utf-8')
+
+
+def compute_delta(old: QuoteTable, new: QuoteTable) -> Optional[Dict[str, dict]]:
+    """
+    两个快照之间的变化: 代码 -> {变化的字段: 新值}
+    股票列表不一致（新增/移除股票）时返回 None，需要推送完整快照
+    """
+    diff = diff_columns(old, new)
+    if diff is None:
+        return None
+    changed_fields, any_changed = diff
+
+    changes: Dict[str, dict] = {}
+    for i in np.flatnonzero(any_changed).tolist():
+        changes[new.codes[i]] = {field: new[field][i].item() for field, diff in changed_fields if diff[i]}
+
+    names_changed = np.flatnonzero(old.names != new.names).tolist()
+    for i in names_changed:
+        changes.setdefault(new.codes[i], {})['name'] = new.names[i]
+    return changes
+
+
+# 队列中的一项: (消息类型, 快照版本, 序列化后的 JSON)；RESYNC 表示需要重新推送完整快照
+Message = Tuple[str, int, str]
+RESYNC: Message = ('resync', 0, '')
+
+
+class Subscriber:
+    """一个推送连接：有界队列，写满时丢弃积压并改为重新同步"""
+
+    __slots__ = ('queue',)
+
+    def __init__(self, maxsize: int):
+        self.queue: 'asyncio.Queue[Message]' = asyncio.Queue(maxsize)
+
+    def offer(self, message: Message) -> bool:
+        """非阻塞投递；队列已满时返回 False 并转为重新同步"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.request_resync()
+            return False
+
+    def request_resync(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESYNC)
+
+
+class QuoteBroadcaster:
+    """按市场广播快照变化"""
+
+    def __init__(self, queue_size: int = 16):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._snapshot_messages: Dict[str, Message] = {}
+        self.stats = {
+            'connections': 0,
+            'deltas': 0,
+            'snapshots': 0,
+            'resyncs': 0,
+        }
+
+    def subscribe(self, market: str) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.setdefault(market, set()).add(subscriber)
+        self.stats['connections'] += 1
+        return subscriber
+
+    def unsubscribe(self, market: str, subscriber: Subscriber):
+        self._subscribers.get(market, set()).discard(subscriber)
+        self.stats['connections'] -= 1
+
+    def snapshot_message(self, market: str, version: int, build: Callable[[], dict]) -> Message:
+        """完整快照消息（按版本缓存，多个连接共享同一份序列化结果）"""
+        message = self._snapshot_messages.get(market)
+        if message is None or message[1] != version:
+            data = _dumps({'type': 'snapshot', 'version': version, **build()})
+            message = ('snapshot', version, data)
+            self._snapshot_messages[market] = message
+        self.stats['snapshots'] += 1
+        return message
+
+    def publish(self, market: str, version: int, base: int, update_time: str,
+                changes: Optional[Dict[str, dict]]):
+        """
+        广播一次刷新结果；changes 为 None 时通知所有连接重新同步
+        没有变化时也推送空的增量，使下一条增量的 base 与客户端的版本衔接
+        没有连接时不做任何序列化
+        """
+        subscribers = self._subscribers.get(market)
+        if not subscribers:
+            return
+
+        if changes is None:
+            for subscriber in subscribers:
+                subscriber.request_resync()
+            return
+
+        message = ('delta', version, _dumps({
+            'type': 'delta', 'version': version, 'base': base,
+            'updateTime': update_time, 'changes': changes,
+        }))
+        self.stats['deltas'] += 1
+        for subscriber in subscribers:
+            if not subscriber.offer(message):
+                self.stats['resyncs'] += 1
+
+    def has_subscribers(self, market: str) -> bool:
+        return bool(self._subscribers.get(market))
+
+
+def encode_sse(message: Message) -> str:
+    kind, version, data = message
+    if kind == 'ping':
+        # 心跳不带 id，以免覆盖浏览器记录的 Last-Event-ID（断线重连时用它判断是否需要重发快照）
+        return f"event: {kind}\ndata: {data}\n\n"
+    return f"event: {kind}\nid: {version}\ndata: {data}\n\n"
+
+
+def encode_ndjson(message: Message) -> str:
+    return message[2] + '\n'
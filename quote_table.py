@@ -0,0 +1,136 @@
+"""
+烟蒂股筛选器 - 列式行情表
+快照按列存储（连续的 numpy 数组），筛选用布尔掩码，排序用 argsort，
+只为最终返回的那一页股票构造 dict
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# 接口返回的股票字段（顺序与 parse_tencent_data 一致）
+ROW_FIELDS = [
+    'code', 'name', 'price', 'previousClose', 'open', 'high', 'low', 'volume',
+    'change', 'changePercent', 'pe', 'pb', 'marketCap', 'floatMarketCap',
+    'dividendYield', 'turnoverRate', 'amplitude',
+]
+
+# 数值列
+INT_FIELDS = ['volume']
+FLOAT_FIELDS = [f for f in ROW_FIELDS if f not in ('code', 'name') and f not in INT_FIELDS]
+NUMERIC_FIELDS = [f for f in ROW_FIELDS if f not in ('code', 'name')]
+
+
+def diff_columns(old: 'QuoteTable', new: 'QuoteTable') -> Optional[Tuple[List[Tuple[str, np.ndarray]], np.ndarray]]:
+    """
+    比较两张代码顺序相同的表：返回 ([(有变化的字段, 该字段的变化掩码)], 任一字段变化的行掩码)
+    股票列表不一致（新增/移除股票）时返回 None
+    """
+    if len(old) != len(new) or not np.array_equal(old.codes, new.codes):
+        return None
+
+    changed_fields = []
+    any_changed = np.zeros(len(new), dtype=bool)
+    for field in NUMERIC_FIELDS:
+        a, b = old[field], new[field]
+        diff = (a != b) & ~(np.isnan(a) & np.isnan(b)) if a.dtype.kind == 'f' else a != b
+        if diff.any():
+            changed_fields.append((field, diff))
+            any_changed |= diff
+    return changed_fields, any_changed
+
+
+class QuoteTable:
+    """
+    列式行情表（只读）
+    - codes / names: object 数组
+    - columns: 字段名 -> float64 / int64 数组，所有列长度一致
+    多个请求共享同一张表，筛选和排序只产生下标数组，不复制数据
+    """
+
+    __slots__ = ('codes', 'names', 'columns', '_index', '_sort_cache')
+
+    def __init__(self, codes: np.ndarray, names: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.codes = codes
+        self.names = names
+        self.columns = columns
+        self._index: Optional[Dict[str, int]] = None
+        self._sort_cache: Dict[tuple, np.ndarray] = {}
+
+    @classmethod
+    def from_rows(cls, rows: List[dict]) -> 'QuoteTable':
+        """由 parse_tencent_data 返回的 dict 列表构建"""
+        codes = np.array([r['code'] for r in rows], dtype=object)
+        names = np.array([r['name'] for r in rows], dtype=object)
+        columns = {}
+        for field in FLOAT_FIELDS:
+            columns[field] = np.fromiter((r[field] for r in rows), dtype=np.float64, count=len(rows))
+        for field in INT_FIELDS:
+            columns[field] = np.fromiter((r[field] for r in rows), dtype=np.int64, count=len(rows))
+        return cls(codes, names, columns)
+
+    @classmethod
+    def empty(cls) -> 'QuoteTable':
+        return cls.from_rows([])
+
+    @classmethod
+    def concat(cls, tables: List['QuoteTable']) -> 'QuoteTable':
+        """按顺序拼接多张表（复制数据）"""
+        return cls(np.concatenate([t.codes for t in tables]), np.concatenate([t.names for t in tables]),
+                   {field: np.concatenate([t.columns[field] for t in tables]) for field in tables[0].columns})
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.columns[field]
+
+    @property
+    def index(self) -> Dict[str, int]:
+        """代码 -> 行号"""
+        if self._index is None:
+            self._index = {code: i for i, code in enumerate(self.codes)}
+        return self._index
+
+    def with_column(self, field: str, values: np.ndarray) -> 'QuoteTable':
+        """替换一列，返回新表（其余列与原表共享，不复制）"""
+        columns = dict(self.columns)
+        columns[field] = values
+        table = QuoteTable(self.codes, self.names, columns)
+        table._index = self._index
+        return table
+
+    def take(self, indices: np.ndarray) -> 'QuoteTable':
+        """按行号取子表（复制所选行）"""
+        return QuoteTable(self.codes[indices], self.names[indices],
+                          {field: values[indices] for field, values in self.columns.items()})
+
+    def argsort(self, field: str, descending: bool = False) -> np.ndarray:
+        """按字段排序后的行号（稳定排序，结果按表缓存）"""
+        key = (field, descending)
+        order = self._sort_cache.get(key)
+        if order is None:
+            values = self.codes if field == 'code' else self.names if field == 'name' else self.columns[field]
+            if descending:
+                # 在反转数组上做稳定排序再映射回来：降序且相等元素保持原有顺序
+                order = len(values) - 1 - np.argsort(values[::-1], kind='stable')[::-1]
+            else:
+                order = np.argsort(values, kind='stable')
+            self._sort_cache[key] = order
+        return order
+
+    def _values(self, indices: Iterable[int]) -> List[list]:
+        """按 ROW_FIELDS 顺序取出指定行的各列（Python 列表）"""
+        indices = np.asarray(indices, dtype=np.intp)
+        values = [self.codes[indices].tolist(), self.names[indices].tolist()]
+        values.extend(self.columns[field][indices].tolist() for field in NUMERIC_FIELDS)
+        return values
+
+    def rows(self, indices: Iterable[int]) -> List[dict]:
+        """只为指定行构造 dict"""
+        return [dict(zip(ROW_FIELDS, row)) for row in zip(*self._values(indices))]
+
+    def row_lists(self, indices: Iterable[int]) -> List[tuple]:
+        """指定行的值数组（字段顺序同 ROW_FIELDS），用于紧凑的 columns 响应格式"""
+        return list(zip(*self._values(indices)))
+
@@ -0,0 +1,120 @@
+"""
+烟蒂股筛选器 - 响应缓存
+同一快照版本上相同查询的响应体只序列化一次，按总字节数做 LRU 淘汰：
+- ETag 由 (接口, 查询, 快照版本) 和内容编码决定，请求带 If-None-Match 且匹配时直接返回 304，不生成响应体
+- 压缩版本（gzip，安装了 brotli 时还有 br）在第一次被请求时生成并随条目缓存
+"""
+
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+from metrics import timed
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+# 小于该字节数的响应不压缩
+COMPRESS_MIN_SIZE = 1024
+
+
+def make_etag(key: Hashable, encoding: Optional[str] = None) -> str:
+    """强校验 ETag：不同内容编码的响应体字节不同，编码名附加在后面（"<hash>-gzip"）"""
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+    return f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # 兼容弱校验形式（W/"..."）和多个 ETag
+    return any(tag.strip().lstrip('W/') == etag for tag in if_none_match.split(','))
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+class CachedBody:
+    """一个已序列化的响应体及其压缩版本"""
+
+    __slots__ = ('etag', 'body', 'encoded')
+
+    def __init__(self, etag: str, body: bytes):
+        self.etag = etag
+        self.body = body
+        self.encoded: Dict[str, bytes] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(v) for v in self.encoded.values())
+
+    def content(self, encoding: Optional[str]) -> bytes:
+        """返回指定编码的响应体（None 表示不压缩），压缩结果缓存"""
+        if encoding is None or len(self.body) < COMPRESS_MIN_SIZE:
+            return self.body
+        data = self.encoded.get(encoding)
+        if data is None:
+            data = brotli.compress(self.body, quality=5) if encoding == 'br' else gzip.compress(self.body, 6)
+            self.encoded[encoding] = data
+        return data
+
+
+class ResponseCache:
+    """(接口, 查询, 快照版本) -> 已序列化响应体 的 LRU，按总字节数限制"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Hashable, CachedBody]' = OrderedDict()
+        self._bytes = 0
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'notModified': 0,
+            'evictions': 0,
+        }
+
+    def get_or_build(self, key: Hashable, build: Callable[[], bytes]) -> CachedBody:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+        self.stats['misses'] += 1
+        entry = CachedBody(make_etag(key), build())
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self._evict()
+        return entry
+
+    def content(self, entry: CachedBody, encoding: Optional[str]) -> bytes:
+        """取指定编码的响应体；新生成的压缩版本计入缓存大小"""
+        if encoding is None or encoding in entry.encoded or len(entry.body) < COMPRESS_MIN_SIZE:
+            return entry.content(encoding)
+
+        before = entry.size
+        with timed('compress'):
+            data = entry.content(encoding)
+        self._bytes += entry.size - before
+        self._evict()
+        return data
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.stats['evictions'] += 1
+
+    def summary(self) -> dict:
+        return {**self.stats, 'entries': len(self._entries), 'bytes': self._bytes}
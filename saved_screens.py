@@ -0,0 +1,237 @@
+"""
+烟蒂股筛选器 - 保存的筛选
+常用的筛选条件（烟蒂股参数或自定义策略）在服务端登记，每个筛选维护一份物化的命中集合：
+- 登记时在当前快照上完整计算一次
+- 之后每次快照刷新，只对输入字段有变化的股票重新求值（条件都是逐行的），
+  代价为 O(变化的股票数)，而不是每个请求 O(全市场)
+- 命中集合的变化（新进入 / 移出）按快照版本记录，可用于提醒
+
+定义保存在 JSON 文件中（多 worker 部署时各进程在文件变化后重新加载，按定义计算出的 id 一致）:
+    {"version": 1, "screens": [{"id": "...", "name": "...", "definition": {...}, "createdAt": ...}]}
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+from quote_table import QuoteTable, diff_columns
+
+Predicate = Callable[[QuoteTable], np.ndarray]
+
+FILE_VERSION = 1
+MAX_SCREENS = 200         # 最多登记的筛选数
+DIFF_HISTORY = 100        # 每个筛选保留的变化记录数
+
+
+def screen_id(definition: dict) -> str:
+    """按规范化定义计算 id（与名称无关，同一定义重复登记得到同一个筛选）"""
+    canonical = json.dumps(definition, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode()).hexdigest()[:12]
+
+
+class SavedScreen:
+    """一个保存的筛选及其物化结果（members 与快照行顺序一致的布尔掩码）"""
+
+    __slots__ = ('id', 'name', 'definition', 'created_at', 'predicate',
+                 'members', 'version', 'dividend_version', 'diffs', 'stats')
+
+    def __init__(self, id: str, name: str, definition: dict, created_at: float, predicate: Predicate):
+        self.id = id
+        self.name = name
+        self.definition = definition
+        self.created_at = created_at
+        self.predicate = predicate
+        self.members: Optional[np.ndarray] = None
+        self.version = 0
+        self.dividend_version = -1
+        self.diffs: Deque[dict] = deque(maxlen=DIFF_HISTORY)
+        self.stats = {'fullEvaluations': 0, 'incrementalEvaluations': 0, 'rowsEvaluated': 0}
+
+    @property
+    def market(self) -> str:
+        return self.definition['market']
+
+    @property
+    def count(self) -> int:
+        return int(self.members.sum()) if self.members is not None else 0
+
+    def evaluate(self, table: QuoteTable, version: int, dividend_version: int,
+                 changed: Optional[np.ndarray] = None, update_time: str = '') -> Optional[dict]:
+        """
+        在新快照上更新命中集合，返回本次变化 {version, base, updateTime, entered, left}（没有变化时返回 None）
+        changed: 与上一个快照相比有变化的行号；None 表示需要完整计算
+        """
+        previous = self.members
+        incremental = (changed is not None and previous is not None and self.dividend_version == dividend_version
+                       and len(previous) == len(table))
+        if incremental:
+            members = previous.copy()
+            if len(changed):
+                members[changed] = self.predicate(table.take(changed))
+            self.stats['incrementalEvaluations'] += 1
+            self.stats['rowsEvaluated'] += len(changed)
+        else:
+            members = np.asarray(self.predicate(table), dtype=bool)
+            self.stats['fullEvaluations'] += 1
+            self.stats['rowsEvaluated'] += len(table)
+
+        base = self.version
+        self.members = members
+        self.version, self.dividend_version = version, dividend_version
+        if previous is None or not incremental:
+            # 首次计算或股票列表变化：不记录进出（无法逐只对应）
+            return None
+
+        entered = np.flatnonzero(members & ~previous)
+        left = np.flatnonzero(previous & ~members)
+        if not len(entered) and not len(left):
+            return None
+        diff = {
+            'version': version,
+            'base': base,
+            'updateTime': update_time,
+            'entered': table.codes[entered].tolist(),
+            'left': table.codes[left].tolist(),
+        }
+        self.diffs.append(diff)
+        return diff
+
+    def changes_since(self, version: int) -> List[dict]:
+        return [diff for diff in self.diffs if diff['version'] > version]
+
+    def summary(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'definition': self.definition,
+            'createdAt': self.created_at,
+            'version': self.version,
+            'count': self.count,
+            'stats': self.stats,
+        }
+
+
+class ScreenRegistry:
+    """保存的筛选：定义持久化到文件，命中集合在每次快照刷新时增量更新"""
+
+    def __init__(self, path: str, compile: Callable[[dict], Predicate]):
+        self.path = path
+        self.compile = compile
+        self._screens: Dict[str, SavedScreen] = {}
+        self._mtime: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._screens)
+
+    # ========== 持久化 ==========
+
+    def load(self):
+        """读取定义文件；已有的筛选保留物化结果，新出现的在下一次刷新时完整计算"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            self._mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"读取保存的筛选失败: {e}")
+            return
+
+        screens = {}
+        for item in data.get('screens', []):
+            try:
+                existing = self._screens.get(item['id'])
+                screens[item['id']] = existing or SavedScreen(
+                    item['id'], item.get('name', ''), item['definition'], item.get('createdAt', 0),
+                    self.compile(item['definition']))
+            except Exception as e:
+                print(f"加载筛选 {item.get('id')} 失败: {e}")
+        self._screens = screens
+
+    def reload_if_changed(self) -> bool:
+        """其他进程修改了定义文件时重新加载（只有一次 stat）"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self.load()
+        return True
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        data = {
+            'version': FILE_VERSION,
+            'screens': [{'id': s.id, 'name': s.name, 'definition': s.definition, 'createdAt': s.created_at}
+                        for s in self._screens.values()],
+        }
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    # ========== 登记 ==========
+
+    def register(self, definition: dict, name: str = '') -> SavedScreen:
+        """登记筛选（定义须已规范化）；已存在时直接返回。编译失败时抛出异常"""
+        self.reload_if_changed()
+        id = screen_id(definition)
+        screen = self._screens.get(id)
+        if screen is not None:
+            return screen
+        if len(self._screens) >= MAX_SCREENS:
+            raise ValueError(f"保存的筛选已达上限（{MAX_SCREENS}）")
+
+        screen = SavedScreen(id, name or id, definition, time.time(), self.compile(definition))
+        self._screens[id] = screen
+        self._save()
+        return screen
+
+    def remove(self, id: str) -> bool:
+        self.reload_if_changed()
+        if self._screens.pop(id, None) is None:
+            return False
+        self._save()
+        return True
+
+    def get(self, id: str) -> Optional[SavedScreen]:
+        return self._screens.get(id)
+
+    def all(self) -> List[SavedScreen]:
+        return list(self._screens.values())
+
+    # ========== 增量更新 ==========
+
+    def update(self, market: str, table: QuoteTable, version: int, previous: Optional[QuoteTable],
+               previous_version: int, dividend_version: int, update_time: str = '') -> List[SavedScreen]:
+        """
+        快照刷新后更新该市场的所有筛选，返回命中集合有变化的筛选
+        与上一个快照比较一次得到变化的行，所有筛选共用
+        """
+        screens = [s for s in self._screens.values() if s.market == market]
+        if not screens:
+            return []
+
+        changed = None
+        if previous is not None:
+            diff = diff_columns(previous, table)
+            if diff is not None:
+                changed = np.flatnonzero(diff[1])
+
+        updated = []
+        for screen in screens:
+            # 筛选的物化结果不是基于上一个快照（新登记、重新加载）时完整计算
+            rows = changed if screen.version == previous_version else None
+            try:
+                if screen.evaluate(table, version, dividend_version, rows, update_time) is not None:
+                    updated.append(screen)
+            except Exception as e:
+                print(f"更新筛选 {screen.id} 失败: {e}")
+        return updated
@@ -0,0 +1,134 @@
+"""
+烟蒂股筛选器 - 跨进程共享快照
+多 worker 部署时由一个刷新进程抓取、解析行情，把每个快照写入内存映射文件；
+各 uvicorn worker 直接 mmap 读取（数值列零拷贝），不再各自访问上游
+
+文件布局（每个市场一个文件，{dir}/{market}.snap）:
+    8 字节   魔数 b'CIGSNAP1'
+    8 字节   元数据长度 N（小端 uint64）
+    N 字节   元数据 JSON: {version, fetchedAt, carried, count, columns: {field: [offset, dtype]}, codes: [offset, itemsize]}
+             carried 为沿用上一快照数据的股票数（部分批次抓取失败）
+    ...      各数值列连续存放（8 字节对齐），之后是定长代码数组和名称（JSON）
+
+写入方先写临时文件再原子替换（os.replace），读取方已映射的旧文件不受影响；
+读取方按 inode + 修改时间判断是否有新快照
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from history_store import MARKET_DIRS
+from quote_table import QuoteTable
+
+MAGIC = b'CIGSNAP1'
+HEADER = struct.Struct('<8sQ')
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def snapshot_path(root: str, market: str) -> str:
+    return os.path.join(root, f'{MARKET_DIRS[market]}.snap')
+
+
+def write_snapshot(root: str, market: str, table: QuoteTable, version: int, fetched_at: float, carried: int = 0):
+    """把一个快照写入共享文件（原子替换）"""
+    codes = np.array([code.encode() for code in table.codes], dtype='S10') if len(table) else np.zeros(0, 'S10')
+    names = json.dumps(table.names.tolist(), ensure_ascii=False).encode()
+
+    # 各段的偏移相对于数据区起点（元数据之后，8 字节对齐）
+    layout: Dict[str, list] = {}
+    blocks = []
+    offset = 0
+    for field, values in table.columns.items():
+        values = np.ascontiguousarray(values)
+        layout[field] = [offset, values.dtype.str]
+        blocks.append((offset, values.tobytes()))
+        offset = _align(offset + values.nbytes)
+    codes_offset = offset
+    blocks.append((offset, codes.tobytes()))
+    offset = _align(offset + codes.nbytes)
+    names_offset = offset
+    blocks.append((offset, names))
+
+    meta = {
+        'version': version,
+        'fetchedAt': fetched_at,
+        'carried': carried,
+        'count': len(table),
+        'columns': layout,
+        'codes': [codes_offset, codes.dtype.itemsize],
+        'names': [names_offset, len(names)],
+    }
+    meta_bytes = json.dumps(meta).encode()
+    data_start = _align(HEADER.size + len(meta_bytes))
+
+    os.makedirs(root, exist_ok=True)
+    path = snapshot_path(root, market)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(meta_bytes)))
+        f.write(meta_bytes)
+        for block_offset, data in blocks:
+            f.seek(data_start + block_offset)
+            f.write(data)
+    os.replace(tmp, path)
+
+
+def read_snapshot(path: str) -> Tuple[QuoteTable, int, float, int]:
+    """映射共享文件，返回 (行情表, 版本号, 抓取时间, 沿用的股票数)；数值列是 mmap 上的只读视图"""
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, meta_length = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise ValueError(f"共享快照文件格式错误: {path}")
+    meta = json.loads(mm[HEADER.size:HEADER.size + meta_length])
+    data_start = _align(HEADER.size + meta_length)
+    count = meta['count']
+
+    columns = {
+        field: np.frombuffer(mm, dtype=np.dtype(dtype), count=count, offset=data_start + offset)
+        for field, (offset, dtype) in meta['columns'].items()
+    }
+    codes_offset, itemsize = meta['codes']
+    raw_codes = np.frombuffer(mm, dtype=f'S{itemsize}', count=count, offset=data_start + codes_offset)
+    names_offset, names_length = meta['names']
+    names = json.loads(mm[data_start + names_offset:data_start + names_offset + names_length])
+
+    table = QuoteTable(
+        np.array([code.decode() for code in raw_codes], dtype=object),
+        np.array(names, dtype=object),
+        columns,
+    )
+    return table, meta['version'], meta['fetchedAt'], meta.get('carried', 0)
+
+
+class SharedSnapshotReader:
+    """worker 侧：发现新快照文件时重新映射，否则不做任何 I/O（只有一次 stat）"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._seen: Dict[str, tuple] = {}
+
+    def poll(self, market: str) -> Optional[Tuple[QuoteTable, int, float, int]]:
+        """有新快照时返回 (行情表, 版本号, 抓取时间, 沿用的股票数)，否则返回 None"""
+        path = snapshot_path(self.root, market)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if self._seen.get(market) == key:
+            return None
+        result = read_snapshot(path)
+        self._seen[market] = key
+        return result
+
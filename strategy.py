@@ -0,0 +1,176 @@
+"""
+烟蒂股筛选器 - 策略引擎（后端）
+与 js/strategy.js 的 StrategyEditor 使用同一套条件 JSON：
+- 简单条件: {type: 'simple', field, operator, value, value2, logicOp}
+- 计算条件: {type: 'calc', field1, calcOp, field2, operator, value, logicOp}
+每个条件通过 logicOp 与前面的结果按顺序组合（且/或）
+
+策略编译为基于 numpy 的向量化谓词，并按规范化后的策略哈希缓存
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from quote_table import QuoteTable
+
+# 可用字段（与 STRATEGY_FIELDS 一致）
+STRATEGY_FIELDS = [
+    'pe', 'pb', 'dividendYield', 'marketCap', 'floatMarketCap',
+    'turnoverRate', 'price', 'changePercent', 'volume',
+]
+
+OPERATORS = ['gt', 'gte', 'lt', 'lte', 'eq', 'between']
+CALC_OPERATORS = ['mul', 'div', 'add', 'sub']
+LOGIC_OPS = ['and', 'or']
+
+# 编译缓存上限
+STRATEGY_CACHE_SIZE = 256
+
+Predicate = Callable[[QuoteTable], np.ndarray]
+
+
+class StrategyError(ValueError):
+    """策略格式错误"""
+
+
+def _to_float(value, what: str) -> float:
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        raise StrategyError(f"{what}不是有效数字: {value!r}")
+    if np.isnan(result):
+        raise StrategyError(f"{what}不是有效数字: {value!r}")
+    return result
+
+
+def _check(value, allowed: List[str], what: str) -> str:
+    if value not in allowed:
+        raise StrategyError(f"不支持的{what}: {value!r}")
+    return value
+
+
+def normalize_strategy(strategy: dict) -> Tuple[tuple, ...]:
+    """
+    规范化策略：去掉 id/name 等无关字段，数值统一为 float
+    返回可哈希的条件元组，作为编译缓存的键
+    """
+    conditions = strategy.get('conditions') if isinstance(strategy, dict) else None
+    if not conditions:
+        raise StrategyError('至少添加一个条件')
+
+    normalized = []
+    for i, c in enumerate(conditions):
+        if not isinstance(c, dict):
+            raise StrategyError(f"条件格式错误: {c!r}")
+
+        # 第一个条件的连接方式没有意义
+        logic_op = 'and' if i == 0 else _check(c.get('logicOp', 'and'), LOGIC_OPS, '逻辑连接符')
+        operator = _check(c.get('operator'), OPERATORS, '运算符')
+        value = _to_float(c.get('value'), '条件值')
+
+        if c.get('type') == 'simple':
+            field = _check(c.get('field'), STRATEGY_FIELDS, '字段')
+            value2 = _to_float(c.get('value2'), '区间上限') if operator == 'between' else None
+            normalized.append(('simple', logic_op, field, operator, value, value2))
+        elif c.get('type') == 'calc':
+            field1 = _check(c.get('field1'), STRATEGY_FIELDS, '字段')
+            field2 = _check(c.get('field2'), STRATEGY_FIELDS, '字段')
+            calc_op = _check(c.get('calcOp'), CALC_OPERATORS, '计算运算符')
+            normalized.append(('calc', logic_op, field1, calc_op, field2, operator, value))
+        else:
+            raise StrategyError(f"不支持的条件类型: {c.get('type')!r}")
+
+    return tuple(normalized)
+
+
+def strategy_hash(normalized: Tuple[tuple, ...]) -> str:
+    return hashlib.sha1(json.dumps(normalized).encode()).hexdigest()[:16]
+
+
+def _compare(values: np.ndarray, operator: str, target: float, target2=None) -> np.ndarray:
+    if operator == 'gt':
+        return values > target
+    if operator == 'gte':
+        return values >= target
+    if operator == 'lt':
+        return values < target
+    if operator == 'lte':
+        return values <= target
+    if operator == 'eq':
+        return np.abs(values - target) < 0.0001
+    if operator == 'between' and target2 is not None:
+        return (values >= min(target, target2)) & (values <= max(target, target2))
+    # 与前端一致：计算条件不支持区间，视为不满足
+    return np.zeros(len(values), dtype=bool)
+
+
+def _column(table: QuoteTable, field: str) -> np.ndarray:
+    # 与前端 `stock[field] || 0` 一致：缺失值按 0 处理
+    return np.nan_to_num(table[field].astype(np.float64, copy=False), nan=0.0)
+
+
+def _compile_condition(condition: tuple) -> Predicate:
+    if condition[0] == 'simple':
+        _, _, field, operator, value, value2 = condition
+        # 股息率在界面中以百分比输入，数据中为小数（与 toBackendParams 一致）
+        if field == 'dividendYield':
+            value = value / 100
+            value2 = value2 / 100 if value2 is not None else None
+        return lambda table: _compare(_column(table, field), operator, value, value2)
+
+    _, _, field1, calc_op, field2, operator, value = condition
+
+    def predicate(table: QuoteTable) -> np.ndarray:
+        val1 = _column(table, field1)
+        val2 = _column(table, field2)
+        if calc_op == 'mul':
+            calc = val1 * val2
+        elif calc_op == 'div':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                calc = np.where(val2 != 0, val1 / np.where(val2 != 0, val2, 1), np.inf)
+        elif calc_op == 'add':
+            calc = val1 + val2
+        else:
+            calc = val1 - val2
+        return _compare(calc, operator, value)
+
+    return predicate
+
+
+def compile_strategy(normalized: Tuple[tuple, ...]) -> Predicate:
+    """把规范化后的条件编译为 table -> 布尔掩码 的谓词"""
+    compiled = [(c[1], _compile_condition(c)) for c in normalized]
+
+    def predicate(table: QuoteTable) -> np.ndarray:
+        mask = compiled[0][1](table)
+        for logic_op, condition in compiled[1:]:
+            if logic_op == 'or':
+                mask = mask | condition(table)
+            else:
+                mask = mask & condition(table)
+        return mask
+
+    return predicate
+
+
+_compiled_cache: 'OrderedDict[str, Predicate]' = OrderedDict()
+
+
+def get_strategy_predicate(strategy: dict) -> Tuple[str, Predicate]:
+    """获取策略的编译结果（按规范化哈希 LRU 缓存），返回 (哈希, 谓词)"""
+    normalized = normalize_strategy(strategy)
+    key = strategy_hash(normalized)
+
+    predicate = _compiled_cache.get(key)
+    if predicate is None:
+        predicate = compile_strategy(normalized)
+        _compiled_cache[key] = predicate
+        if len(_compiled_cache) > STRATEGY_CACHE_SIZE:
+            _compiled_cache.popitem(last=False)
+    else:
+        _compiled_cache.move_to_end(key)
+    return key, predicate
@@ -0,0 +1,123 @@
+"""
+烟蒂股筛选器 - 股票池
+启动时从数据文件（data/universe.json）加载各市场的股票代码及所属板块：
+- 去重（同一代码只保留第一次出现的板块）
+- 校验交易所前缀：A 股按代码数字确定 sh/sz/bj，前缀写错时纠正并提示；格式无效的代码丢弃
+- 板块以紧凑的编号存储（代码 -> 板块编号），筛选时按编号生成掩码
+
+文件格式:
+    {
+      "version": 1,
+      "indices": ["sh000001", ...],
+      "markets": {"a股": {"银行": ["sh601398", ...], ...}, "港股": {...}}
+    }
+"""
+
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# A 股代码首位 -> 交易所前缀
+A_SHARE_PREFIXES = {'6': 'sh', '9': 'sh', '0': 'sz', '2': 'sz', '3': 'sz', '4': 'bj', '8': 'bj'}
+
+A_SHARE_PATTERN = re.compile(r'^(sh|sz|bj)\d{6}$')
+HK_PATTERN = re.compile(r'^hk\d{5}$')
+
+# 没有板块信息的股票
+NO_SECTOR = -1
+
+
+class UniverseError(ValueError):
+    """股票池文件或板块参数错误"""
+
+
+def normalize_code(market: str, code: str) -> Optional[str]:
+    """校验并规范化代码，无效时返回 None"""
+    code = code.strip().lower()
+    if market == '港股':
+        return code if HK_PATTERN.match(code) else None
+
+    if not A_SHARE_PATTERN.match(code):
+        return None
+    prefix = A_SHARE_PREFIXES.get(code[2])
+    return prefix + code[2:] if prefix else None
+
+
+class MarketUniverse:
+    """一个市场的股票池：代码列表（去重后，保持文件中的顺序）+ 板块编号"""
+
+    __slots__ = ('market', 'codes', 'sectors', 'sector_of')
+
+    def __init__(self, market: str, codes: List[str], sectors: List[str], sector_of: Dict[str, int]):
+        self.market = market
+        self.codes = codes
+        self.sectors = sectors
+        self.sector_of = sector_of
+
+    def sector_ids(self, names: Iterable[str]) -> Tuple[int, ...]:
+        """板块名 -> 编号（排序后的元组，可作为缓存键）"""
+        ids = set()
+        for name in names:
+            name = name.strip()
+            if not name:
+                continue
+            if name not in self.sectors:
+                raise UniverseError(f"不支持的板块: {name}")
+            ids.add(self.sectors.index(name))
+        return tuple(sorted(ids))
+
+    def sector_column(self, codes: np.ndarray) -> np.ndarray:
+        """与行情表对齐的板块编号列"""
+        sector_of = self.sector_of
+        return np.fromiter((sector_of.get(code, NO_SECTOR) for code in codes), dtype=np.int16, count=len(codes))
+
+    def summary(self) -> List[dict]:
+        counts = np.bincount(np.fromiter(self.sector_of.values(), dtype=np.intp), minlength=len(self.sectors))
+        return [{'id': i, 'name': name, 'count': int(counts[i])} for i, name in enumerate(self.sectors)]
+
+
+class Universe:
+    def __init__(self, markets: Dict[str, MarketUniverse], indices: List[str]):
+        self.markets = markets
+        self.indices = indices
+
+    def __getitem__(self, market: str) -> MarketUniverse:
+        return self.markets[market]
+
+
+def load_universe(path: str) -> Universe:
+    with open(path, encoding='utf-8') as f:
+        doc = json.load(f)
+    if not isinstance(doc.get('markets'), dict):
+        raise UniverseError(f"股票池文件格式错误: {path}")
+
+    markets = {}
+    for market, sector_codes in doc['markets'].items():
+        codes: List[str] = []
+        sectors: List[str] = []
+        sector_of: Dict[str, int] = {}
+        duplicates = 0
+
+        for sector, raw_codes in sector_codes.items():
+            sector_id = len(sectors)
+            sectors.append(sector)
+            for raw in raw_codes:
+                code = normalize_code(market, raw)
+                if code is None:
+                    print(f"股票池: 丢弃无效代码 {raw} ({market}/{sector})")
+                    continue
+                if code != raw:
+                    print(f"股票池: 代码 {raw} 的交易所前缀有误，已纠正为 {code}")
+                if code in sector_of:
+                    duplicates += 1
+                    continue
+                sector_of[code] = sector_id
+                codes.append(code)
+
+        if duplicates:
+            print(f"股票池: {market} 去除 {duplicates} 个重复代码")
+        markets[market] = MarketUniverse(market, codes, sectors, sector_of)
+
+    return Universe(markets, list(doc.get('indices', [])))
@@ -0,0 +1,112 @@
+"""
+烟蒂股筛选器 - 上游保护
+- TokenBucket: 限制对行情接口的请求速率（令牌桶，允许短时突发）
+- CircuitBreaker: 连续失败达到阈值后熔断，熔断期间所有上游请求直接失败，不再等待超时；
+  冷却时间过后由后台探测请求验证上游是否恢复，探测失败时冷却时间加倍（有上限）
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个；rate <= 0 表示不限速"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self.stats = {'acquired': 0, 'waited': 0, 'waitSeconds': 0.0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """取一个令牌，没有令牌时等待补充"""
+        self.stats['acquired'] += 1
+        if self.rate <= 0:
+            return
+
+        self._refill()
+        # 先扣减再等待：并发的等待者按到达顺序排队，不会同时醒来争抢
+        self._tokens -= 1
+        if self._tokens < 0:
+            delay = -self._tokens / self.rate
+            self.stats['waited'] += 1
+            self.stats['waitSeconds'] += delay
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    closed: 正常放行，连续失败 failure_threshold 次后转为 open
+    open: 拒绝所有请求；冷却时间到后 probe_due() 为真，由探测请求决定恢复（closed）或继续熔断
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, max_reset_timeout: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+        self.state = self.CLOSED
+        self._failures = 0
+        self._cooldown = reset_timeout
+        self._opened_at = 0.0
+        self.stats = {'opened': 0, 'rejected': 0, 'probes': 0, 'probeFailures': 0}
+
+    @property
+    def closed(self) -> bool:
+        return self.state == self.CLOSED
+
+    def allow(self) -> bool:
+        """普通请求是否放行（熔断期间直接拒绝）"""
+        if self.state == self.CLOSED:
+            return True
+        self.stats['rejected'] += 1
+        return False
+
+    def record_success(self):
+        self._failures = 0
+
+    def record_failure(self):
+        self._failures += 1
+        if self.state == self.CLOSED and self._failures >= self.failure_threshold:
+            self._open(self.reset_timeout)
+
+    def probe_due(self) -> bool:
+        """熔断中且冷却时间已到，可以发送探测请求"""
+        return self.state == self.OPEN and time.monotonic() - self._opened_at >= self._cooldown
+
+    def record_probe(self, ok: bool):
+        """探测结果：成功则恢复，失败则加倍冷却时间后继续熔断"""
+        self.stats['probes'] += 1
+        if ok:
+            self.state = self.CLOSED
+            self._failures = 0
+            print("上游行情已恢复，熔断解除")
+        else:
+            self.stats['probeFailures'] += 1
+            self._open(min(self._cooldown * 2, self.max_reset_timeout))
+
+    def _open(self, cooldown: float):
+        if self.state == self.CLOSED:
+            self.stats['opened'] += 1
+            print(f"上游行情连续失败 {self._failures} 次，熔断 {cooldown:.0f} 秒")
+        self.state = self.OPEN
+        self._cooldown = cooldown
+        self._opened_at = time.monotonic()
+
+    def summary(self) -> dict:
+        return {
+            **self.stats,
+            'state': self.state,
+            'consecutiveFailures': self._failures,
+            'cooldown': self._cooldown,
+            'openFor': round(time.monotonic() - self._opened_at, 1) if self.state == self.OPEN else 0,
+        }